@@ -1,37 +1,210 @@
 # Import necessary libraries
-import random # for generating random numbers
+# namedtuple for lightweight snapshots of an issue's state
+from collections import namedtuple
+# datetime, timedelta for the times issues were last changed and resolved
+from datetime import datetime, timedelta
+# wraps for the API's login decorator
+from functools import wraps
 # flask for creating the web application
 # abort, render_template, request, redirect, url_for, flash from flask for handling various web requests and responses
-from flask import Flask, abort, render_template, request, redirect, url_for, flash
+from flask import Flask, abort, render_template, request, redirect, url_for, flash, g, Response, stream_with_context, jsonify, make_response
+# session from flask, as browser_session, for remembering that a user recently wrote and must read from the primary,
+# and has_request_context for telling whether a commit happens while handling a request
+from flask import session as browser_session, has_request_context
 # CSRFProtect from flask_wtf for CSRF protection
 from flask_wtf import CSRFProtect
-# SQLAlchemy from flask_sqlalchemy for database handling
-from flask_sqlalchemy import SQLAlchemy
+# generate_csrf from flask_wtf.csrf for handing the CSRF token to API clients
+from flask_wtf.csrf import generate_csrf
+# RoutingSQLAlchemy, use_replica, read_from_primary from replicas for database handling, with reads sent to read replicas
+from replicas import RoutingSQLAlchemy, use_replica, read_from_primary
+# event, func, and_, or_, case, literal, select from sqlalchemy for session hooks, aggregate and bulk queries
+from sqlalchemy import event, func, and_, or_, case, literal, select
+# create_engine from sqlalchemy for the read replica engines, text for the readiness probe's query
+from sqlalchemy import create_engine, text
+# IntegrityError, SQLAlchemyError from sqlalchemy for accounts created concurrently and failed readiness checks
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+# StaleDataError from sqlalchemy for updates of issues that someone else changed in the meantime
+from sqlalchemy.orm.exc import StaleDataError
 # UserMixin, LoginManager, login_user, current_user, logout_user, login_required from flask_login for user authentication and session management
 from flask_login import UserMixin, LoginManager, login_user, current_user, logout_user, login_required
 # IssueFormEmployee, IssueFormSupport, RegistrationForm, LoginForm, UpdateAccountForm from forms are custom forms for handling user input
-from forms import IssueFormEmployee, IssueFormSupport, RegistrationForm, LoginForm, UpdateAccountForm
-# generate_password_hash, check_password_hash from werkzeug.security for handling password hashing and verification
-from werkzeug.security import generate_password_hash, check_password_hash
+from forms import IssueFormEmployee, IssueFormSupport, IssueImportForm, BulkTriageForm, RegistrationForm, LoginForm, UpdateAccountForm, ISSUE_CATEGORIES, ISSUE_STATUSES
+# parse_list_args, build_page_query, split_page, open_issues_clause, SORT_OPTIONS, OPEN_STATUS_FILTER from listing for keyset paginated issue lists
+from listing import parse_list_args, apply_filters, build_page_query, split_page, encode_cursor, open_issues_clause, closed_issues_clause, SORT_OPTIONS, OPEN_STATUS_FILTER, DEFAULT_PAGE_SIZE
+# search_backend, has_search_terms, MAX_SEARCH_PAGE from search for full-text search over issue descriptions
+from search import search_backend, has_search_terms, MAX_SEARCH_PAGE
+# PasswordService, PasswordServiceBusy, DEFAULT_HASH_METHOD from passwords for hashing and verifying passwords off the request threads
+from passwords import PasswordService, PasswordServiceBusy, DEFAULT_HASH_METHOD
+# RateLimiter from rate_limit for limiting login attempts per account and per client address
+from rate_limit import RateLimiter
+# ProxyFix from werkzeug for reading the client address from X-Forwarded-For behind a reverse proxy
+from werkzeug.middleware.proxy_fix import ProxyFix
+# AssignmentEngine, is_open from assignment for picking the support staff member a new issue is assigned to
+from assignment import AssignmentEngine, is_open
+# export_chunks, read_records, validate_record, chunked, FORMATS, EXPORT_FIELDS from bulk_io for bulk export and import of issues
+from bulk_io import export_chunks, read_records, validate_record, chunked, FORMATS, EXPORT_FIELDS
+# upgrade, current_version from migrations for applying the versioned schema migrations
+from migrations import upgrade, current_version
+# check_plans from query_plans for checking that the routes' queries use the indexes
+from query_plans import check_plans
+# MultiDict from werkzeug.datastructures for building list parameters outside of a request
+from werkzeug.datastructures import MultiDict
+# RequestMetrics, CallbackGauge from metrics for per-request instrumentation exposed on /metrics
+from metrics import RequestMetrics, CallbackGauge
+# SyntheticData, SEED_PASSWORD, employee_email from seed_data for generating data to benchmark against
+from seed_data import SyntheticData, SEED_PASSWORD, employee_email
+# add_counter_deltas, apply_counter_deltas, reconcile_counters, summarize_counters from counters for the dashboard counters
+from counters import add_counter_deltas, apply_counter_deltas, reconcile_counters, summarize_counters
+# QueryCache, make_backend and the tag helpers from page_cache for caching the data behind the issue pages
+from page_cache import QueryCache, make_backend, issue_tag, employee_issues_tag, issue_list_tags, issue_change_tags
+# make_etag, is_not_modified, add_validators, not_modified_response from conditional for the API's conditional GETs
+from conditional import make_etag, is_not_modified, add_validators, not_modified_response
+# EventBroker, PostgresRelay, issue_events, notify_events, event_stream from events for the live issue event streams
+from events import EventBroker, PostgresRelay, issue_events, notify_events, event_stream
+# TTLCache from ttl_cache for caching resolved user roles in the worker process
+from ttl_cache import TTLCache
+# AssetPipeline, fetch_vendor_assets from assets for the fingerprinted static files and compressed responses
+from assets import AssetPipeline, fetch_vendor_assets
+# FileSystemBytecodeCache from jinja2 for keeping the compiled templates across worker processes
+from jinja2 import FileSystemBytecodeCache
 # os for interacting with the operating system
 import os
+# io for reading uploaded files as text
+import io
+# click for printing the output of the Flask CLI commands
+import click
+# time for reporting how long the seeding took
+import time
+# secrets for generating the passwords of support staff created without one
+import secrets
+# json for the page cache tags kept in the issue change log
+import json
+
+# This function builds the SQLAlchemy engine options for the database URI from the environment
+# Connection pool settings only apply to server databases, SQLite is left with SQLAlchemy's own pool
+def engine_options(database_uri):
+    if database_uri.startswith('sqlite'):
+        return {}
+    options = {
+        # Number of connections kept open per worker process, and how many more may be opened under load
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        # Seconds to wait for a free connection before giving up
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        # Seconds after which a connection is replaced, so the database or a proxy never closes it under us
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        # Check a connection is alive before handing it out
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+    }
+    # Cancel statements running longer than DB_STATEMENT_TIMEOUT_MS milliseconds
+    statement_timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    if statement_timeout and database_uri.startswith('postgresql'):
+        options['connect_args'] = {'options': '-c statement_timeout=%d' % statement_timeout}
+    return options
 
 # Setting up the Flask application
 # Initialize flask application
 app = Flask(__name__)
 # Setup configurations for SQLAlchemy. Here we provide the connection string for the postgresql database.
-app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql://ticketing_user:qwerty123@db/ticketing_system'
+# The DATABASE_URL environment variable can point the application at another database, such as a local SQLite file.
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'postgresql://ticketing_user:qwerty123@db/ticketing_system')
+# Connection pool settings for the database, see engine_options
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+# Comma separated connection strings of read replicas of the database, which serve the reads of GET requests
+app.config['SQLALCHEMY_REPLICA_URIS'] = [uri.strip() for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri.strip()]
+# Seconds a user's requests keep reading from the primary after they wrote, so they see their own changes
+app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
 # We set this to False to disable signalling the application every time a change is about to be made in the database.
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 # Default view to redirect to when the user needs to log in
 app.config['LOGIN_VIEW'] = 'login'
 # Generate a secret key for our application. This is used by Flask to handle sessions securely.
-SECRET_KEY = os.urandom(32)
+# Set SECRET_KEY in the environment when running several processes, so they all accept the same session cookies.
+SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
 app.config['SECRET_KEY'] = SECRET_KEY
+# Maximum number of user roles kept in the per-process role cache
+app.config['ROLE_CACHE_SIZE'] = int(os.environ.get('ROLE_CACHE_SIZE', 10000))
+# Number of seconds a cached user role stays valid
+app.config['ROLE_CACHE_TTL'] = int(os.environ.get('ROLE_CACHE_TTL', 300))
+# Strategy used to assign new issues: 'least_open', 'round_robin' or 'location_affinity'
+app.config['ASSIGNMENT_STRATEGY'] = os.environ.get('ASSIGNMENT_STRATEGY', 'least_open')
+# Number of seconds after which the per-process open-issue counters are seeded again from the database
+app.config['ASSIGNMENT_RESEED_SECONDS'] = int(os.environ.get('ASSIGNMENT_RESEED_SECONDS', 300))
+# Number of rows fetched from the database and written to the response at a time by the issue export
+app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+# Number of issues inserted per statement and committed per transaction by the issue import
+app.config['IMPORT_CHUNK_SIZE'] = int(os.environ.get('IMPORT_CHUNK_SIZE', 500))
+# Requests and database queries slower than these many milliseconds are logged together with their SQL
+app.config['SLOW_REQUEST_MS'] = int(os.environ.get('SLOW_REQUEST_MS', 500))
+app.config['SLOW_QUERY_MS'] = int(os.environ.get('SLOW_QUERY_MS', 100))
+# Add X-Query-Count and X-DB-Time-Ms headers to every response, for debugging
+app.config['METRICS_DEBUG_HEADERS'] = os.environ.get('METRICS_DEBUG_HEADERS', 'false').lower() in ('1', 'true', 'yes')
+# Bearer token required to read /metrics, if set
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# Directory the worker processes share their metrics through, so every scrape of /metrics reports all of them;
+# gunicorn.conf.py sets it for the workers of a gunicorn server
+app.config['METRICS_MULTIPROC_DIR'] = os.environ.get('METRICS_MULTIPROC_DIR')
+app.config['METRICS_FLUSH_SECONDS'] = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+# Cache the issue lists and issue details behind /issues, /my_issues and /issues/<id>
+app.config['PAGE_CACHE_ENABLED'] = os.environ.get('PAGE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Maximum number of entries kept in the per-process page cache, and the number of seconds an entry stays valid
+app.config['PAGE_CACHE_SIZE'] = int(os.environ.get('PAGE_CACHE_SIZE', 2000))
+app.config['PAGE_CACHE_TTL'] = int(os.environ.get('PAGE_CACHE_TTL', 60))
+# Redis URL of a page cache shared by every worker process, instead of one cache per process
+app.config['PAGE_CACHE_URL'] = os.environ.get('PAGE_CACHE_URL')
+# Number of issue changes kept in the issue change log, which the per-process page caches invalidate their entries from;
+# a process that falls further behind drops its whole cache
+app.config['PAGE_CACHE_CHANGE_LOG_SIZE'] = int(os.environ.get('PAGE_CACHE_CHANGE_LOG_SIZE', 10000))
+# Live updates of the issue lists over Server-Sent Events, off by default: every open stream holds a worker thread for
+# up to EVENTS_STREAM_SECONDS, so only turn them on with an asynchronous worker class (WEB_WORKER_CLASS=gevent)
+app.config['EVENTS_ENABLED'] = os.environ.get('EVENTS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# Number of events queued for a slow event stream before it is told to resync, and event streams served per process
+app.config['EVENTS_QUEUE_SIZE'] = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+app.config['EVENTS_MAX_STREAMS'] = int(os.environ.get('EVENTS_MAX_STREAMS', 1000))
+# Seconds between keep-alive comments on an idle event stream, and seconds before a stream is closed for the browser to reconnect
+app.config['EVENTS_HEARTBEAT_SECONDS'] = int(os.environ.get('EVENTS_HEARTBEAT_SECONDS', 15))
+app.config['EVENTS_STREAM_SECONDS'] = int(os.environ.get('EVENTS_STREAM_SECONDS', 300))
+# Largest number of issues a single bulk triage action may change
+app.config['BULK_TRIAGE_LIMIT'] = int(os.environ.get('BULK_TRIAGE_LIMIT', 5000))
+# Number of days after which resolved issues are moved to the archive by flask archive-issues
+app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+# Werkzeug hash method of new passwords; existing hashes made with another method are replaced on the next login
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD)
+# Threads hashing passwords per worker process, hashing work allowed to wait for them, and seconds a request waits
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+# Login attempts allowed per client address and failed login attempts allowed per account, and their windows in seconds
+# Only failed attempts are counted; without PROXY_COUNT, every client behind a reverse proxy shares the proxy's address,
+# so LOGIN_IP_LIMIT=0 turns the per-address limit off for such deployments
+app.config['LOGIN_IP_LIMIT'] = int(os.environ.get('LOGIN_IP_LIMIT', 20))
+app.config['LOGIN_IP_WINDOW'] = int(os.environ.get('LOGIN_IP_WINDOW', 60))
+app.config['LOGIN_ACCOUNT_LIMIT'] = int(os.environ.get('LOGIN_ACCOUNT_LIMIT', 5))
+app.config['LOGIN_ACCOUNT_WINDOW'] = int(os.environ.get('LOGIN_ACCOUNT_WINDOW', 300))
+# Number of reverse proxies in front of the application that append to X-Forwarded-For, 0 when clients connect directly
+app.config['PROXY_COUNT'] = int(os.environ.get('PROXY_COUNT', 0))
+if app.config['PROXY_COUNT']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_COUNT'])
+# HTML and JSON responses of at least COMPRESS_MIN_SIZE bytes are compressed with gzip (or brotli, if installed)
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+# Check the static files for changes on every page, for working on the stylesheets
+app.config['ASSETS_RELOAD'] = os.environ.get('ASSETS_RELOAD', 'false').lower() in ('1', 'true', 'yes')
+# Keep the compiled templates on disk, so a new worker process loads them instead of compiling every template again
+# Without JINJA_BYTECODE_CACHE_DIR they are kept in a directory of the current user under the system's temporary directory
+app.config['JINJA_BYTECODE_CACHE'] = os.environ.get('JINJA_BYTECODE_CACHE', 'true').lower() in ('1', 'true', 'yes')
+app.config['JINJA_BYTECODE_CACHE_DIR'] = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
+if app.config['JINJA_BYTECODE_CACHE']:
+    if app.config['JINJA_BYTECODE_CACHE_DIR']:
+        os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+    # This has to be set before the template environment is first used
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR']))
 # Initialize CSRF protection for our application
 csrf = CSRFProtect()
 # Initialize SQLAlchemy to connect to the database
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
+# Engines of the read replicas, each with its own connection pool
+replica_engines = [create_engine(uri, **engine_options(uri)) for uri in app.config['SQLALCHEMY_REPLICA_URIS']]
 # Initialize Login Manager for handling user sessions
 login_manager = LoginManager(app)
 # Setup Flask app within login manager
@@ -40,6 +213,13 @@ login_manager.init_app(app)
 csrf.init_app(app)
 # Specify the name of the view to redirect to when the user needs to log in.
 login_manager.login_view = 'login'
+# Instrument every request and database query, and expose the results on /metrics
+request_metrics = RequestMetrics(app)
+# Serve the static files under fingerprinted URLs and compress the HTML and JSON responses
+asset_pipeline = AssetPipeline(app)
+# Expose the number of static files served and the compressed responses and bytes saved on /metrics
+request_metrics.add(CallbackGauge('asset_pipeline', 'Static asset and response compression statistics.', ('stat',),
+                                  lambda: {(stat,): value for stat, value in asset_pipeline.stats().items()}))
 
 
 # Define the models for the database based on the schema
@@ -86,6 +266,42 @@ class Issue(db.Model):
     status = db.Column(db.String(50), nullable=False, default='Reported')
     # support_name is an optional field
     support_name = db.Column(db.String(100))
+    # updated_at is the time the issue was created or last changed, set automatically
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # resolved_at is the time the issue was resolved, and empty while it is open
+    resolved_at = db.Column(db.DateTime)
+    # version is incremented by every update; updates only apply to the version they were made against
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    # Let SQLAlchemy check and increment the version in the WHERE clause of every UPDATE and DELETE of an issue,
+    # raising StaleDataError instead of overwriting a change committed since the issue was loaded
+    __mapper_args__ = {'version_id_col': version}
+
+
+# ArchivedIssue Model corresponding to the 'issues_archive' table in the database
+# Issues resolved long ago are moved here by flask archive-issues, so the issues table only holds the live set
+# The columns are those of the issues table, plus the time the issue was archived
+class ArchivedIssue(db.Model):
+    # Specify the name of the table
+    __tablename__ = 'issues_archive'
+
+    # Define columns in the table, as in the issues table
+    # issue_id is the primary key, keeping the id the issue had in the issues table
+    issue_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # employee_id is not a foreign key, so archiving never has to check or lock the employees table
+    employee_id = db.Column(db.Integer, nullable=False)
+    employee_name = db.Column(db.String(100), nullable=False)
+    employee_email = db.Column(db.String(120), nullable=False)
+    location = db.Column(db.String(100), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    support_name = db.Column(db.String(100))
+    updated_at = db.Column(db.DateTime)
+    resolved_at = db.Column(db.DateTime)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    # archived_at is the time the issue was moved to the archive
+    archived_at = db.Column(db.DateTime, nullable=False)
 
 
 # SupportStaff Model corresponding to the 'support_staff' table in the database
@@ -101,6 +317,53 @@ class SupportStaff(db.Model):
     email = db.Column(db.String(100), nullable=False, unique=True)
 
 
+# IssueCounter Model corresponding to the 'issue_counters' table in the database
+# Holds the number of issues per status, category, location and assignee for the home page dashboard
+# The counters are adjusted in the same transaction as every issue change, see record_issue_change
+class IssueCounter(db.Model):
+    # Specify the name of the table
+    __tablename__ = 'issue_counters'
+
+    # Define columns in the table
+    # status, category, location and support_name together form the primary key
+    status = db.Column(db.String(50), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    location = db.Column(db.String(100), primary_key=True)
+    # support_name is an empty string for unassigned issues, as primary key columns cannot be null
+    support_name = db.Column(db.String(100), primary_key=True)
+    # count is the number of issues with these values
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+# IssueChangeMarker Model corresponding to the 'issue_change_marker' table in the database
+# Its single row is bumped in the same transaction as every change to the issues, so API clients polling for changes
+# can be answered from this row alone, see bump_issue_change_marker
+class IssueChangeMarker(db.Model):
+    # Specify the name of the table
+    __tablename__ = 'issue_change_marker'
+
+    # Define columns in the table
+    # marker_id is the primary key, the table only ever holds the row with marker_id 1
+    marker_id = db.Column(db.Integer, primary_key=True)
+    # version is incremented by every transaction that changes issues, changed_at is the time of the last one
+    version = db.Column(db.Integer, nullable=False, default=0)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# IssueChangeLog Model corresponding to the 'issue_change_log' table in the database
+# Every transaction that bumps the issue change marker adds a row with the page cache tags its changes affect, so the
+# per-process page caches drop only those entries, see issue_changes_since; only the latest rows are kept
+class IssueChangeLog(db.Model):
+    # Specify the name of the table
+    __tablename__ = 'issue_change_log'
+
+    # Define columns in the table
+    # version is the version of the issue change marker the transaction bumped it to
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    # tags is a JSON list of the page cache tags, or NULL when the changes affect every entry
+    tags = db.Column(db.Text)
+
+
 # Users Model to manage user login, inheriting from UserMixin and db.Model
 # UserMixin is a default implementation for user authentication provided by Flask-Login
 class Users(UserMixin, db.Model):
@@ -113,29 +376,500 @@ class Users(UserMixin, db.Model):
     # email is a unique field and cannot be null
     email = db.Column(db.String(120), unique=True, nullable=False)
     # password cannot be null
-    password = db.Column(db.String(120), nullable=False)
+    # password holds the hash of the password, long enough for the hashes of every werkzeug method
+    password = db.Column(db.String(255), nullable=False)
 
 
-# This function is used to determine the type of user based on the email
-def get_user_type(email):
-    # Check if the provided email belongs to an Employee
-    # If an Employee with this email exists in the database, return 'employee'
-    if Employee.query.filter_by(email=email).first():
+# Per-process cache of user roles keyed by email, so most requests resolve the role without a query
+role_cache = TTLCache(maxsize=app.config['ROLE_CACHE_SIZE'], ttl=app.config['ROLE_CACHE_TTL'])
+
+# Expose the role cache's hit, miss and eviction counters and its size on /metrics
+request_metrics.add(CallbackGauge('role_cache', 'Role cache statistics.', ('stat',),
+                                  lambda: {(stat,): value for stat, value in role_cache.stats().items()}))
+
+# Password hashing and verification runs in a bounded pool of threads per worker process, see PasswordService
+password_service = PasswordService(method=app.config['PASSWORD_HASH_METHOD'], workers=app.config['PASSWORD_HASH_WORKERS'],
+                                   max_pending=app.config['PASSWORD_HASH_QUEUE'], timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+request_metrics.add(CallbackGauge('password_service', 'Password hashing statistics.', ('stat',),
+                                  lambda: {(stat,): value for stat, value in password_service.stats().items()}))
+
+# Login attempts are limited per client address, and failed attempts per account
+login_ip_limiter = RateLimiter(app.config['LOGIN_IP_LIMIT'], app.config['LOGIN_IP_WINDOW'])
+login_account_limiter = RateLimiter(app.config['LOGIN_ACCOUNT_LIMIT'], app.config['LOGIN_ACCOUNT_WINDOW'])
+request_metrics.add(CallbackGauge('login_rate_limit', 'Login rate limiter statistics.', ('limiter', 'stat'),
+                                  lambda: {(name, stat): value for name, limiter in (('ip', login_ip_limiter), ('account', login_account_limiter))
+                                           for stat, value in limiter.stats().items()}))
+
+# This function maps whether an email belongs to an Employee and/or a Support Staff member to the type of user
+def user_type_from_profiles(is_employee, is_support):
+    # An Employee takes precedence, as it always has
+    if is_employee:
         return 'employee'
-    # Check if the provided email belongs to a Support Staff member
-    # If a Support Staff with this email exists in the database, return 'support'
-    elif SupportStaff.query.filter_by(email=email).first():
+    elif is_support:
         return 'support'
-    # If the provided email does not belong to either an Employee or a Support Staff member, return None
+    # The email does not belong to either an Employee or a Support Staff member
     return None
 
+# This function remembers the type of user for an email, both for the rest of the request and in the role cache
+def remember_user_type(email, user_type):
+    g.setdefault('user_types', {})[email] = user_type
+    # Unknown emails are not cached, so a later registration is picked up straight away
+    if user_type is not None:
+        role_cache.set(email, user_type)
+
+# This function removes a cached type of user, used when an account's email changes or the account is deleted
+def forget_user_type(email):
+    g.setdefault('user_types', {}).pop(email, None)
+    role_cache.delete(email)
+
+# This function is used to determine the type of user based on the email
+def get_user_type(email):
+    # Reuse the type already resolved earlier in this request
+    user_types = g.setdefault('user_types', {})
+    if email in user_types:
+        return user_types[email]
+    # Otherwise try the per-process role cache
+    user_type = role_cache.get(email)
+    if user_type is None:
+        # Check whether the email belongs to an Employee and to a Support Staff member in a single query
+        is_employee, is_support = db.session.query(
+            Employee.query.filter_by(email=email).exists(),
+            SupportStaff.query.filter_by(email=email).exists(),
+        ).one()
+        user_type = user_type_from_profiles(is_employee, is_support)
+    remember_user_type(email, user_type)
+    return user_type
+
+# Columns needed to render a row of the issue lists
+# The description column is deliberately left out so it is never read for a listing
+ISSUE_LIST_COLUMNS = (Issue.issue_id, Issue.employee_name, Issue.location, Issue.category, Issue.status, Issue.support_name)
+# Plain tuples holding a row of the issue lists and an issue with all its columns, as kept in the page cache
+IssueListRow = namedtuple('IssueListRow', [column.key for column in ISSUE_LIST_COLUMNS])
+# The issue records also tell whether the issue was read from the archive
+ISSUE_COLUMN_NAMES = Issue.__table__.columns.keys()
+IssueRecord = namedtuple('IssueRecord', ISSUE_COLUMN_NAMES + ['archived'])
+# Page cache tag of the lists of archived issues
+ARCHIVE_TAG = 'archive'
+
+# Cache of the issue lists and issue details, keyed by route, user and list parameters
+# Only query results are cached, the pages are still rendered per request since they carry CSRF tokens and flash messages
+# Committed issue changes invalidate the entries they affect, see invalidate_cached_pages
+# Without a shared backend, those invalidations only reach the cache of the process that made the change, so before
+# every lookup the cache also drops the entries that the other processes' changes affected, from the issue change log
+page_cache = QueryCache(make_backend(app.config['PAGE_CACHE_URL'], app.config['PAGE_CACHE_SIZE'], app.config['PAGE_CACHE_TTL']),
+                        enabled=app.config['PAGE_CACHE_ENABLED'],
+                        changes=None if app.config['PAGE_CACHE_URL'] else lambda version: issue_changes_since(version))
+
+# Expose the page cache's hit, miss, invalidation and eviction counters and its size on /metrics
+request_metrics.add(CallbackGauge('page_cache', 'Page cache statistics.', ('stat',),
+                                  lambda: {(stat,): value for stat, value in page_cache.stats().items()}))
+
+# This function returns the value the page cache holds for the key parts, or loads it with loader and caches it
+# Values that go into the cache are read from the primary: one read from a lagging replica would otherwise be served
+# until the issues it shows change again, rather than until the replica has caught up
+def cached_load(key_parts, tags, loader):
+    if not page_cache.enabled:
+        return loader()
+    return page_cache.get_or_load(key_parts, tags, lambda: read_from_primary(db.session, loader))
+
+# This function returns the columns of ISSUE_LIST_COLUMNS of the issues table or of the archive
+def issue_list_columns(model):
+    return [getattr(model, column.key) for column in ISSUE_LIST_COLUMNS]
+
+# This function builds the query for one page of the issue list matching the given criteria and list parameters
+# Filtering, sorting and pagination are all pushed down into SQL, and only ISSUE_LIST_COLUMNS are selected
+# The list is read from the issues table, or from the archive when model is ArchivedIssue
+def build_issue_list_query(params, *criteria, model=Issue):
+    query = model.query.with_entities(*issue_list_columns(model)).filter(*criteria)
+    return build_page_query(query, model, params)
+
+# This function loads one page of the issue list matching the given criteria and returns it with the next page's cursor
+def load_issue_page(params, *criteria, model=Issue):
+    issues, next_cursor = split_page(build_issue_list_query(params, *criteria, model=model).all(), params)
+    return [IssueListRow(*issue) for issue in issues], next_cursor
+
+# This function tells whether the request asks for archived issues rather than the live ones
+def wants_archived():
+    return request.args.get('archived') == '1'
+
+# This function loads one page of the issue list of every issue, or of an employee's issues, for the request's query string
+# Archived issues are listed instead of the live ones when the query string asks for them
+# The page is cached per cache_scope and list parameters under cache_tags, or under the tags of the list's filters
+def query_issue_page(cache_scope, cache_tags, employee_id=None):
+    # Read the filters, sort order, page size and cursor from the query string
+    params = parse_list_args(request.args)
+    archived = wants_archived()
+    model = ArchivedIssue if archived else Issue
+    criteria = [model.employee_id == employee_id] if employee_id is not None else []
+    # Fetch the page and work out the cursor of the next one, unless they are cached already
+    # Archived lists only change when issues are archived or deleted with their reporter
+    key = ['issue_page', cache_scope, archived, params.filters, params.sort, params.per_page, params.cursor]
+    if archived:
+        tags = [ARCHIVE_TAG]
+    else:
+        tags = cache_tags if cache_tags is not None else issue_list_tags(params.filters)
+    issues, next_cursor = cached_load(key, tags, lambda: load_issue_page(params, *criteria, model=model))
+    # Build the link to the next page, keeping the current filters and sort order
+    next_url = None
+    if next_cursor:
+        next_url = url_for(request.endpoint, **dict(request.args.items(), cursor=next_cursor))
+    return issues, params, next_url
+
+# This function builds the query for one page of the issues matching a full-text search and the given criteria
+# Results are ordered by relevance, so they are paginated by page number rather than by cursor
+# The issues table is searched, or the archive when model is ArchivedIssue
+def build_issue_search_query(text, page, *criteria, model=Issue):
+    query = model.query.with_entities(*issue_list_columns(model)).filter(*criteria)
+    query = search_backend(db.engine.dialect.name, model.__tablename__).apply(query, model.issue_id, text)
+    return query.offset((page - 1) * DEFAULT_PAGE_SIZE).limit(DEFAULT_PAGE_SIZE + 1)
+
+# This function loads an issue with all its columns, or returns None if there is no issue with the id
+# Issues that are not in the issues table are looked up in the archive
+def load_issue_record(issue_id):
+    row = db.session.query(*Issue.__table__.columns).filter(Issue.issue_id == issue_id).first()
+    if row is not None:
+        return IssueRecord(*row, archived=False)
+    archive = ArchivedIssue.__table__
+    row = db.session.query(*[archive.c[name] for name in ISSUE_COLUMN_NAMES]).filter(archive.c.issue_id == issue_id).first()
+    return IssueRecord(*row, archived=True) if row is not None else None
+
+# This function tells whether the current user is the employee who reported the issue
+def is_issue_owner(issue):
+    return current_user.employee_id is not None and issue.employee_id == current_user.employee_id
+
+# This function tells whether a user of the given type may see and update an issue:
+# the employee who reported it and every support staff member can
+def can_access_issue(issue, user_type):
+    return is_issue_owner(issue) or user_type == 'support'
+
+# This function creates an issue reported by the current employee from a validated IssueFormEmployee
+# The issue is assigned by the assignment engine and its creation recorded, the caller commits it
+def create_issue(form):
+    # Query the Employee table to get the employee id, name, location, and email of the current user
+    employee_info = db.session.query(Employee.employee_id, Employee.location, Employee.name, Employee.email)\
+                  .filter(Employee.employee_id == current_user.employee_id).first()
+    # Let the assignment engine pick the support staff member for the issue
+    support_name = assign_support(employee_info.location)
+    # Create a new Issue object with the form data and the information obtained above
+    issue = Issue(
+        employee_id = employee_info.employee_id,
+        employee_name = employee_info.name,
+        employee_email = employee_info.email,
+        location = employee_info.location,
+        category=form.category.data,
+        description=form.description.data,
+        support_name=support_name,
+    )
+    # Add the new issue to the database session and record its creation
+    db.session.add(issue)
+    db.session.flush()
+    record_issue_change(None, issue_state(issue))
+    return issue
+
+# This function returns the resolved_at time of an issue that is set to the given status now
+def resolved_at_for(status):
+    return None if is_open(status) else datetime.utcnow()
+
+# This function updates an issue from a validated IssueFormEmployee or IssueFormSupport and records the change
+# Employees change the category and description, support staff the status, taking the issue over; the caller commits it
+def apply_issue_update(issue, user_type, form):
+    # Take a snapshot of the issue before it is changed
+    before = issue_state(issue)
+    # If user is an employee, update the issue category and description
+    if user_type == 'employee':
+        issue.category = form.category.data
+        issue.description = form.description.data
+    # If user is a support user, update the issue status and the support user's name
+    elif user_type == 'support':
+        support_user = SupportStaff.query.join(Users, Users.email == SupportStaff.email).filter(Users.email == current_user.email).first()
+        issue.status = form.status.data
+        issue.support_name = support_user.name
+        # Keep the time the issue was resolved, for the archive
+        if issue.status != before.status:
+            issue.resolved_at = resolved_at_for(issue.status)
+    # Record the change
+    record_issue_change(before, issue_state(issue))
+
+# This function returns the bulk triage form, with every support staff member to assign issues to
+def bulk_triage_form():
+    form = BulkTriageForm()
+    form.support_name.choices = [('', 'Keep assignee')] + [(name, name) for name, in db.session.query(SupportStaff.name).order_by(SupportStaff.name)]
+    return form
+
+# This function sets the status and/or the assignee of every issue the query selects with a single UPDATE statement,
+# and records each change so the counters, caches and event streams see it like any other update
+# Only issues that actually change are touched; it returns the number changed, or None if more than limit would change
+def bulk_update_issues(query, status, support_name, limit):
+    values, differs = {}, []
+    if status:
+        values[Issue.status] = status
+        # Only issues whose status changes get a new resolved_at time
+        values[Issue.resolved_at] = case((Issue.status != status, literal(resolved_at_for(status), db.DateTime)), else_=Issue.resolved_at)
+        differs.append(Issue.status != status)
+    if support_name:
+        values[Issue.support_name] = support_name
+        differs.append(or_(Issue.support_name.is_(None), Issue.support_name != support_name))
+    # Lock the issues that will change, in a consistent order, and take a snapshot of each of them
+    rows = query.with_entities(Issue.issue_id, Issue.employee_id, Issue.status, Issue.category, Issue.location, Issue.support_name)\
+                .filter(or_(*differs)).order_by(Issue.issue_id).with_for_update().limit(limit + 1).all()
+    if len(rows) > limit:
+        return None
+    if not rows:
+        return 0
+    # Update exactly the locked issues, so issues matching the filters since the snapshot are left alone
+    # The UPDATE bypasses the ORM's version check, so the versions are incremented explicitly
+    values[Issue.version] = Issue.version + 1
+    changed = Issue.query.filter(Issue.issue_id.in_([row.issue_id for row in rows]))\
+                .update(values, synchronize_session=False)
+    for row in rows:
+        before = IssueState(*row)
+        record_issue_change(before, before._replace(status=status or before.status, support_name=support_name or before.support_name))
+    return changed
+
+# This function renders the issues.html template for a page of issues returned by query_issue_page
+# Support staff also get the bulk triage form
+def render_issue_list(issues, params, next_url, user_type):
+    archived = wants_archived()
+    bulk_form = bulk_triage_form() if user_type == 'support' and not archived else None
+    return render_template('issues.html', issues=issues, params=params, next_url=next_url, user_type=user_type,
+                           statuses=ISSUE_STATUSES, categories=ISSUE_CATEGORIES, sort_options=SORT_OPTIONS,
+                           open_status=OPEN_STATUS_FILTER, bulk_form=bulk_form, archived=archived)
+
+# Snapshot of the fields of an issue that the trackers of issue changes care about
+IssueState = namedtuple('IssueState', ['issue_id', 'employee_id', 'status', 'category', 'location', 'support_name'])
+
+# This function takes a snapshot of an issue's state
+def issue_state(issue):
+    return IssueState(issue.issue_id, issue.employee_id, issue.status, issue.category, issue.location, issue.support_name)
+
+# This function records that an issue went from the before state to the after state in the current transaction
+# before is None for a new issue and after is None for a deleted one
+# The dashboard counters are adjusted when the transaction is committed, in the same transaction,
+# and the change is handed to the issue_change_listeners once the transaction has been committed
+def record_issue_change(before, after):
+    db.session.info.setdefault('issue_changes', []).append((before, after))
+    add_counter_deltas(db.session.info.setdefault('counter_deltas', {}), before, after)
+    mark_issues_changed(issue_change_tags(before, after))
+
+# This function notes that the current transaction changes issues, so the issue change marker is bumped when it commits
+# tags are the page cache tags of the entries the changes affect, None for every entry
+# Changes that do not go through record_issue_change, such as a reporter's new email, call it directly
+def mark_issues_changed(tags=None):
+    info = db.session.info
+    info['issues_changed'] = True
+    if tags is None or info.get('changed_tags', set()) is None:
+        info['changed_tags'] = None
+    else:
+        info.setdefault('changed_tags', set()).update(tags)
+
+# Write the dashboard counter changes of the transaction, with one upsert for all of them
+# The pending issue changes are flushed first, so every transaction locks the issue rows before the counter rows,
+# as the bulk updates and the archiving do, and two transactions never wait on each other's locks in opposite orders
+@event.listens_for(db.session, 'before_commit')
+def write_counter_deltas(session):
+    deltas = session.info.pop('counter_deltas', None)
+    if deltas:
+        session.flush()
+        apply_counter_deltas(session, IssueCounter.__table__, deltas)
+
+# Functions called with (before, after) for every committed issue change
+issue_change_listeners = []
+
+# Keep the user on the primary for a while after a transaction that wrote, so they read their own changes
+# even if the replicas lag behind; the time is kept in the user's session cookie, so it holds across workers
+@event.listens_for(db.session, 'after_commit')
+def stick_to_primary(session):
+    if session.info.pop('wrote', False) and replica_engines and has_request_context():
+        browser_session['primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+
+# Send the reads of GET requests to a read replica, unless the user wrote recently
+@app.before_request
+def route_reads():
+    if replica_engines and request.method in ('GET', 'HEAD') and browser_session.get('primary_until', 0) <= time.time():
+        use_replica(db.session, replica_engines)
+
+# Hand the issue changes of a committed transaction to the listeners
+@event.listens_for(db.session, 'after_commit')
+def dispatch_issue_changes(session):
+    changes = session.info.pop('issue_changes', [])
+    session.info.pop('assignment_reservations', None)
+    for before, after in changes:
+        for listener in issue_change_listeners:
+            listener(before, after)
+
+# Forget the issue changes of a rolled back transaction, and give back any assignment picked for it
+@event.listens_for(db.session, 'after_rollback')
+def discard_issue_changes(session):
+    session.info.pop('issue_changes', None)
+    session.info.pop('counter_deltas', None)
+    session.info.pop('issues_changed', None)
+    session.info.pop('changed_tags', None)
+    session.info.pop('wrote', None)
+    for support_name, location in session.info.pop('assignment_reservations', []):
+        assignment_engine.release(support_name, location)
+
+# These functions return the number of open issues per support staff member and location, in one aggregate query
+# Support staff members with no open issues are included with a count of 0
+def load_support_workload_query():
+    return db.session.query(SupportStaff.name, Issue.location, func.count(Issue.issue_id))\
+            .outerjoin(Issue, and_(Issue.support_name == SupportStaff.name, open_issues_clause(Issue)))\
+            .group_by(SupportStaff.name, Issue.location)
+
+def load_support_workload():
+    return load_support_workload_query().all()
+
+# Per-process engine assigning new issues to support staff, based on in-memory open-issue counters
+assignment_engine = AssignmentEngine(load_support_workload, strategy=app.config['ASSIGNMENT_STRATEGY'],
+                                     reseed_interval=app.config['ASSIGNMENT_RESEED_SECONDS'])
+
+# This function keeps the assignment engine's counters in step with committed issue changes
+def track_assignment_load(before, after):
+    # New issues were already counted when the assignment engine picked their assignee
+    if before is not None:
+        assignment_engine.apply(before, after)
+
+issue_change_listeners.append(track_assignment_load)
+
+# This function invalidates the cached issue pages that a committed issue change affects
+def invalidate_cached_pages(before, after):
+    page_cache.invalidate(issue_change_tags(before, after))
+
+issue_change_listeners.append(invalidate_cached_pages)
+
+# Per-process broker handing issue events to the open event streams
+event_broker = EventBroker(queue_size=app.config['EVENTS_QUEUE_SIZE'], max_subscribers=app.config['EVENTS_MAX_STREAMS'])
+# On Postgres the events of every worker process reach the broker through LISTEN/NOTIFY
+event_relay = PostgresRelay(event_broker)
+
+# This function tells whether issue events are fanned out across processes with Postgres' LISTEN/NOTIFY
+def relays_events():
+    return db.engine.dialect.name == 'postgresql'
+
+# Send the events of a transaction's issue changes to every worker process, delivered by Postgres when it commits
+@event.listens_for(db.session, 'before_commit')
+def notify_issue_events(session):
+    if app.config['EVENTS_ENABLED'] and relays_events():
+        events = [issue_event for before, after in session.info.get('issue_changes', []) for issue_event in issue_events(before, after)]
+        if events:
+            notify_events(session, events)
+
+# Bump the issue change marker for a transaction that changed issues
+# Every such transaction updates the marker's single row, so the row lock serializes their commits; the listener is
+# registered after every other before_commit listener and flushes the pending changes first, so the marker and the
+# change log are the last statements of the transaction and the lock is only held for the commit itself
+# With per-process page caches, the transaction also logs the page cache tags of its changes under the new version,
+# and drops the log's oldest row, so the log keeps the latest PAGE_CACHE_CHANGE_LOG_SIZE changes
+@event.listens_for(db.session, 'before_commit')
+def bump_issue_change_marker(session):
+    tags = session.info.pop('changed_tags', None)
+    if session.info.pop('issues_changed', False):
+        session.flush()
+        marker = IssueChangeMarker.__table__
+        session.execute(marker.update().where(marker.c.marker_id == 1)
+                        .values(version=marker.c.version + 1, changed_at=datetime.utcnow()))
+        if page_cache.enabled and page_cache.changes is not None:
+            log = IssueChangeLog.__table__
+            version = select(marker.c.version).where(marker.c.marker_id == 1)
+            logged_tags = json.dumps(sorted(tags)) if tags is not None else None
+            session.execute(log.insert().from_select(['version', 'tags'], version.add_columns(literal(logged_tags, db.Text))))
+            session.execute(log.delete().where(log.c.version <= version.scalar_subquery() - app.config['PAGE_CACHE_CHANGE_LOG_SIZE']))
+
+# This function publishes the events of a committed issue change to this process' event streams
+# It stands in for LISTEN/NOTIFY on other databases, where only the streams of the same process receive the events
+def publish_issue_events(before, after):
+    if app.config['EVENTS_ENABLED'] and not relays_events():
+        for issue_event in issue_events(before, after):
+            event_broker.publish(issue_event)
+
+issue_change_listeners.append(publish_issue_events)
+
+# Expose the number of open event streams and the published and dropped event counters on /metrics
+request_metrics.add(CallbackGauge('issue_events', 'Issue event stream statistics.', ('stat',),
+                                  lambda: {(stat,): value for stat, value in event_broker.stats().items()}))
+
+# Expose the assignment engine's open-issue counters on /metrics
+request_metrics.add(CallbackGauge('assignment_open_issues', 'Open issues per support staff member, as tracked by the assignment engine.',
+                                  ('support_name',), lambda: {(name,): count for name, count in assignment_engine.open_counts().items()}))
+
+# This function lets the assignment engine pick the support staff member for a new issue at the location
+# The pick is remembered so that it is given back if the transaction is rolled back
+def assign_support(location):
+    support_name = assignment_engine.pick(location)
+    db.session.info.setdefault('assignment_reservations', []).append((support_name, location))
+    return support_name
+
+# This function counts a new issue that already has an assignee towards the assignment engine's counters
+def count_assignment(state):
+    if state.support_name and is_open(state.status):
+        assignment_engine.apply(None, state)
+        db.session.info.setdefault('assignment_reservations', []).append((state.support_name, state.location))
+
+# This function imports the issues of a CSV or NDJSON text stream and returns (number imported, [(line number, error)])
+# Records are validated against the issue form's categories and the support staff, and inserted with one multi-row INSERT per chunk,
+# each chunk in its own transaction, so memory use and lock times stay bounded however large the file is
+def import_issues(text_stream, fmt):
+    imported, errors = 0, []
+    # Load the names of the support staff once, assignees of the records are checked against them
+    support_names = {name for name, in db.session.query(SupportStaff.name)}
+    for chunk in chunked(read_records(text_stream, fmt), app.config['IMPORT_CHUNK_SIZE']):
+        # Validate the records of the chunk
+        valid = []
+        for line_number, record in chunk:
+            values, error = validate_record(record, support_names)
+            if error:
+                errors.append((line_number, error))
+            else:
+                valid.append((line_number, values))
+        # Load the reporters of the chunk in a single query
+        employee_ids = {values['employee_id'] for line_number, values in valid}
+        employees = {}
+        if employee_ids:
+            employees = {employee.employee_id: employee for employee in
+                         db.session.query(Employee.employee_id, Employee.name, Employee.email, Employee.location)
+                         .filter(Employee.employee_id.in_(employee_ids))}
+        # Fill in the reporter's details and the assignee of every issue
+        rows = []
+        for line_number, values in valid:
+            employee = employees.get(values['employee_id'])
+            if employee is None:
+                errors.append((line_number, 'no employee with id %d' % values['employee_id']))
+                continue
+            values.update(employee_name=employee.name, employee_email=employee.email, location=employee.location,
+                          resolved_at=resolved_at_for(values['status']))
+            if values['support_name'] is None and is_open(values['status']):
+                values['support_name'] = assign_support(employee.location)
+            else:
+                count_assignment(IssueState(None, employee.employee_id, values['status'], values['category'], employee.location, values['support_name']))
+            rows.append(values)
+        # Insert the chunk with a single multi-row INSERT statement and commit it
+        if rows:
+            db.session.execute(Issue.__table__.insert().values(rows))
+            for values in rows:
+                record_issue_change(None, IssueState(None, values['employee_id'], values['status'], values['category'], values['location'], values['support_name']))
+        db.session.commit()
+        imported += len(rows)
+    return imported, errors
+
 # This function is a callback function used by Flask-Login's user_loader decorator. 
 # Flask-Login uses this function behind the scenes to load the user from the session
 @login_manager.user_loader
 def load_user(user_id):
-    # It queries the Users table using the user_id and returns the User object
+    # It queries the Users table using the user_id, together with the matching Employee and Support Staff rows,
+    # so the user and their type are loaded in a single query
+    row = db.session.query(Users, Employee.employee_id, SupportStaff.support_id)\
+            .outerjoin(Employee, Employee.email == Users.email)\
+            .outerjoin(SupportStaff, SupportStaff.email == Users.email)\
+            .filter(Users.id == int(user_id)).first()
     # If a user with the provided id doesn't exist in the database, it returns None.
-    return Users.query.get(int(user_id))
+    if row is None:
+        return None
+    user, employee_id, support_id = row
+    # Keep the employee id with the logged-in user, issue ownership is checked against it
+    user.employee_id = employee_id
+    # Keep the type of user with the logged-in user, so get_user_type does not query it again
+    user.user_type = user_type_from_profiles(employee_id is not None, support_id is not None)
+    remember_user_type(user.email, user.user_type)
+    return user
 
 
 # Define a Flask route for the home page of the application
@@ -144,27 +878,70 @@ def load_user(user_id):
 def home():
     # Get the type of the user (employee or support staff)
     user_type = get_user_type(current_user.email)
-    # Render the home.html template and pass the user_type to it
-    return render_template('home.html', user_type=user_type)
+    # Support staff get a dashboard of issue counts, read from the issue counters rather than counted from the issues
+    dashboard = None
+    if user_type == 'support':
+        counters = db.session.query(IssueCounter.status, IssueCounter.category, IssueCounter.location,
+                                    IssueCounter.support_name, IssueCounter.count).filter(IssueCounter.count > 0).all()
+        dashboard = summarize_counters(counters)
+    # Render the home.html template and pass the user_type and the dashboard to it
+    return render_template('home.html', user_type=user_type, dashboard=dashboard, statuses=ISSUE_STATUSES, open_status=OPEN_STATUS_FILTER)
 
 # Define a Flask route for the issues page of the application, accessible only to helpdesk staff
 @app.route('/issues') 
 @login_required # Decorator to ensure that the user is authenticated before they can access the issues page
 def all_issues():
-    # Query the SupportStaff table to find a support staff member with the current user's email
-    support_staff = SupportStaff.query.filter_by(email=current_user.email).first()
     # Get the type of the user (employee or support staff)
     user_type = get_user_type(current_user.email)
     # If the current user is not a support staff member, they are not allowed to access the issues page
-    if not support_staff:
+    if user_type != 'support':
         # Show a flash message to the user stating they don't have the necessary permissions to view the page
         flash('You do not have the necessary permissions to view this page.', 'danger')
         # Redirect the user to the home page
         return redirect(url_for('home'))
-    # If the user is a support staff member, query all issues from the Issue table
-    issues = Issue.query.all()
-    # Render the issues.html template, passing in the list of issues and the user_type to it
-    return render_template('issues.html', issues=issues, user_type=user_type)
+    # If the user is a support staff member, query one page of all issues, filtered and sorted as requested
+    # Support staff all see the same lists, so the page is cached for all of them
+    issues, params, next_url = query_issue_page('support', None)
+    # Render the issues.html template, passing in the page of issues and the user_type to it
+    return render_issue_list(issues, params, next_url, user_type)
+
+# Define a Flask route for bulk triage on the issues page, accessible only to helpdesk staff
+# It sets the status and/or assignee of the selected issues, or of every issue matching the list's filters,
+# in one transaction with a single UPDATE statement
+@app.route('/issues/bulk', methods=['POST'])
+@login_required
+def bulk_triage_issues():
+    # Get the type of the user (employee or support staff)
+    user_type = get_user_type(current_user.email)
+    # If the current user is not a support staff member, they are not allowed to triage issues
+    if user_type != 'support':
+        abort(403)
+    # The list's filters and sort order are passed along in the query string, so the user gets back to the same list
+    back_to_list = redirect(url_for('all_issues', **dict(request.args.items())))
+    form = bulk_triage_form()
+    if not form.validate_on_submit():
+        flash('The bulk action could not be applied, please try again.', 'danger')
+        return back_to_list
+    if not form.status.data and not form.support_name.data:
+        flash('Choose a status or a support staff member to apply.', 'warning')
+        return back_to_list
+    if form.scope.data == 'selected':
+        issue_ids = [int(issue_id) for issue_id in request.form.getlist('issue_ids') if issue_id.isdigit()]
+        if not issue_ids:
+            flash('No issues were selected.', 'warning')
+            return back_to_list
+        query = Issue.query.filter(Issue.issue_id.in_(issue_ids))
+    else:
+        query = apply_filters(Issue.query, Issue, parse_list_args(request.args).filters)
+    limit = app.config['BULK_TRIAGE_LIMIT']
+    changed = bulk_update_issues(query, form.status.data, form.support_name.data, limit)
+    if changed is None:
+        db.session.rollback()
+        flash('More than %d issues would change. Please narrow down the filters.' % limit, 'danger')
+        return back_to_list
+    db.session.commit()
+    flash('%d issue%s updated.' % (changed, '' if changed == 1 else 's'), 'success')
+    return back_to_list
 
 # Define a Flask route for the personal issues page of an employee
 @app.route('/my_issues') 
@@ -178,21 +955,135 @@ def my_issues():
         flash('You do not have the necessary permissions to view this page.', 'danger')
         # Redirect the user to the home page
         return redirect(url_for('home'))
-    # Query the Issue table to get all issues reported by the current user
-    issues = Issue.query.filter_by(employee_email=current_user.email).all() 
-    # Render the issues.html template, passing in the list of issues and the user_type to it
-    return render_template('issues.html', issues=issues, user_type=user_type)
+    # Query one page of the issues reported by the current user, filtered and sorted as requested
+    # The page is cached for the employee, and invalidated by any change to their issues
+    issues, params, next_url = query_issue_page(['employee', current_user.employee_id], [employee_issues_tag(current_user.employee_id)],
+                                                employee_id=current_user.employee_id)
+    # Render the issues.html template, passing in the page of issues and the user_type to it
+    return render_issue_list(issues, params, next_url, user_type)
+
+# Define a Flask route streaming live issue events to the issue pages as Server-Sent Events
+# Support staff receive the events of every issue, employees those of their own issues
+@app.route('/events')
+@login_required
+def issue_event_stream():
+    if not app.config['EVENTS_ENABLED']:
+        abort(404)
+    # Get the type of the user (employee or support staff)
+    user_type = get_user_type(current_user.email)
+    if user_type == 'support':
+        employee_id = None
+    elif user_type == 'employee':
+        employee_id = current_user.employee_id
+    else:
+        abort(403)
+    if relays_events():
+        event_relay.start(db.engine)
+    subscription = event_broker.subscribe(employee_id)
+    if subscription is None:
+        # The browser retries by itself
+        return Response('Too many event streams.', status=503, headers={'Retry-After': '30'})
+    # The stream stays open for minutes, so give the database connection back to the pool before it starts
+    db.session.remove()
+    stream = event_stream(event_broker, subscription, app.config['EVENTS_HEARTBEAT_SECONDS'], app.config['EVENTS_STREAM_SECONDS'])
+    # Tell proxies such as nginx not to buffer the stream
+    return Response(stream, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Define a Flask route for exporting issues as CSV or NDJSON, accessible only to helpdesk staff
+# The export takes the same filters as the issues page and streams the rows from a server-side cursor in batches
+@app.route('/issues/export')
+@login_required
+def export_issues():
+    # Get the type of the user (employee or support staff)
+    user_type = get_user_type(current_user.email)
+    # If the current user is not a support staff member, they are not allowed to export issues
+    if user_type != 'support':
+        flash('You do not have the necessary permissions to view this page.', 'danger')
+        return redirect(url_for('home'))
+    # Check the requested file format
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        abort(400)
+    # Select the exported columns of the issues matching the filters, in a stable order
+    params = parse_list_args(request.args)
+    query = apply_filters(Issue.query.with_entities(*[getattr(Issue, field) for field in EXPORT_FIELDS]), Issue, params.filters)
+    batch_size = app.config['EXPORT_BATCH_SIZE']
+    rows = query.order_by(Issue.issue_id).execution_options(stream_results=True).yield_per(batch_size)
+    # Stream the file, keeping the request context (and database session) alive until the last row is sent
+    response = Response(stream_with_context(export_chunks(rows, fmt, batch_size)), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = 'attachment; filename=issues.%s' % fmt
+    return response
+
+# Define a Flask route for bulk importing issues from a CSV or NDJSON file, accessible only to helpdesk staff
+@app.route('/issues/import', methods=['GET', 'POST'])
+@login_required
+def bulk_import_issues():
+    # Get the type of the user (employee or support staff)
+    user_type = get_user_type(current_user.email)
+    # If the current user is not a support staff member, they are not allowed to import issues
+    if user_type != 'support':
+        flash('You do not have the necessary permissions to view this page.', 'danger')
+        return redirect(url_for('home'))
+    # Create a new form object from the IssueImportForm class
+    form = IssueImportForm()
+    # Check if the form data is valid when the form is submitted
+    if form.validate_on_submit():
+        upload = form.file.data
+        # The file format is taken from the file extension, which the form has already checked
+        fmt = upload.filename.rsplit('.', 1)[-1].lower()
+        imported, errors = import_issues(io.TextIOWrapper(upload.stream, encoding='utf-8', newline=''), fmt)
+        # Report the result, listing the first few rejected lines
+        flash('%d issues have been imported.' % imported, 'success')
+        for line_number, error in errors[:10]:
+            flash('Line %d was skipped: %s' % (line_number, error), 'danger')
+        if len(errors) > 10:
+            flash('%d more lines were skipped.' % (len(errors) - 10), 'danger')
+        return redirect(url_for('all_issues'))
+    # Render the import_issues.html template, passing in the form and the user_type to it
+    return render_template('import_issues.html', title='Import Issues', form=form, user_type=user_type)
+
+# Define a Flask route for searching issue descriptions
+@app.route('/issues/search')
+@login_required
+def search_issues():
+    # Get the type of the user (employee or support staff)
+    user_type = get_user_type(current_user.email)
+    # Archived issues are searched instead of the live ones when the query string asks for them
+    archived = wants_archived()
+    model = ArchivedIssue if archived else Issue
+    # Employees only find the issues they reported, as on the issue page, while support staff find every issue
+    if user_type == 'employee':
+        criteria = [model.employee_id == current_user.employee_id]
+    elif user_type == 'support':
+        criteria = []
+    else:
+        abort(403)
+    # Read the search text and the page number from the query string
+    text = request.args.get('q', '').strip()
+    page = max(1, min(request.args.get('page', 1, type=int), MAX_SEARCH_PAGE))
+    issues, next_url = [], None
+    if has_search_terms(text):
+        # Query one page of the matching issues, plus one row to tell whether there is a next page
+        issues = build_issue_search_query(text, page, *criteria, model=model).all()
+        if len(issues) > DEFAULT_PAGE_SIZE:
+            issues = issues[:DEFAULT_PAGE_SIZE]
+            if page < MAX_SEARCH_PAGE:
+                next_url = url_for('search_issues', q=text, page=page + 1, **({'archived': '1'} if archived else {}))
+    # Render the search.html template, passing in the results and the user_type to it
+    return render_template('search.html', issues=issues, q=text, page=page, next_url=next_url, user_type=user_type, archived=archived)
 
 # Define a Flask route for an individual issue page
 @app.route('/issues/<int:issue_id>', methods=['GET', 'POST']) 
 @login_required # Decorator to ensure that the user is authenticated before they can access an individual issue page
 def issue(issue_id):
-    # Query the Issue table to get the issue with the provided issue_id or return a 404 error if not found
-    issue = Issue.query.get_or_404(issue_id)
+    # Get the issue with the provided issue_id from the page cache or the database, or return a 404 error if not found
+    issue = cached_load(['issue', issue_id], [issue_tag(issue_id)], lambda: load_issue_record(issue_id))
+    if issue is None:
+        abort(404)
     # Get the type of the user (employee or support staff)
     user_type = get_user_type(current_user.email)
     # If the current user is neither the reporting employee of the issue nor a support staff, they are not allowed to access the page
-    if (current_user.email != issue.employee_email) and (user_type != 'support'):
+    if not can_access_issue(issue, user_type):
         # Abort with a 403 error
         abort(403)
     # Render the issue.html template, passing in the issue and the user_type to it
@@ -213,26 +1104,8 @@ def add_issue():
     form = IssueFormEmployee()
     # Check if the form data is valid when the form is submitted
     if form.validate_on_submit():
-        # Query the SupportStaff table to get all support staff names
-        support_staff_names = SupportStaff.query.with_entities(SupportStaff.name).all()
-        # Select a support staff at random
-        random_support_name = random.choice(support_staff_names)
-        # Query the Employee and Users tables to get the employee id, name, location, and email of the current user
-        employee_info = db.session.query(Employee.employee_id, Employee.location, Employee.name, Employee.email)\
-                      .join(Users, Employee.email == Users.email)\
-                      .filter(Users.email == current_user.email).first()
-        # Create a new Issue object with the form data and the information obtained above
-        issue = Issue(
-            employee_id = employee_info.employee_id,
-            employee_name = employee_info.name,
-            employee_email = employee_info.email,
-            location = employee_info.location,
-            category=form.category.data,
-            description=form.description.data,
-            support_name=random_support_name[0],
-        )
-        # Add the new issue to the database session
-        db.session.add(issue)
+        # Create the issue from the form data, assigned to a support staff member
+        issue = create_issue(form)
         # Commit the changes to the database
         db.session.commit()
         # Redirect the user to the issue page for the newly created issue
@@ -249,8 +1122,8 @@ def update_issue(issue_id):
     # Get the user type of the current user
     user_type = get_user_type(current_user.email)
     # Verify if the user is the one who created the issue or a support user, else abort
-    if (current_user.email != issue.employee_email) and (user_type != 'support'):
-        abort(403)    
+    if not can_access_issue(issue, user_type):
+        abort(403)
     # If the user is an employee, use the IssueFormEmployee form
     if user_type == 'employee':
         form = IssueFormEmployee()
@@ -261,23 +1134,29 @@ def update_issue(issue_id):
         abort(403)  # or handle this case as needed
     # Check if the form is submitted and validate the form inputs
     if form.validate_on_submit():
-        # If user is an employee, update the issue category and description
-        if user_type == 'employee':
-            issue.category = form.category.data
-            issue.description = form.description.data
-        # If user is a support user, update the issue status and the support user's name
-        elif user_type == 'support':
-            support_user = SupportStaff.query.join(Users, Users.email == SupportStaff.email).filter(Users.email == current_user.email).first()
-            issue.status = form.status.data
-            issue.support_name = support_user.name
-        # Save changes to database
-        db.session.commit()
+        # Refuse the update if the form does not carry the version it was filled from, as the update could then
+        # overwrite changes the user never saw, or if someone else changed the issue since the form was loaded
+        if form.version.data is None:
+            return issue_update_conflict(issue, form, user_type, 'This form is missing the version of the issue it was filled from. Check the current values and submit again to apply your changes.')
+        if form.version.data != issue.version:
+            return issue_update_conflict(issue, form, user_type)
+        # Update the issue as allowed for the type of user, and save the change to the database
+        # The UPDATE only matches the version that was loaded, so a change committed in the meantime is never overwritten
+        apply_issue_update(issue, user_type, form)
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            issue = Issue.query.get_or_404(issue_id)
+            return issue_update_conflict(issue, form, user_type)
         # Show a success message
         flash('Issue has been updated!', 'success')
         # Redirect the user to the updated issue page
         return redirect(url_for('issue', issue_id=issue.issue_id))
     # If a GET request, pre-populate the form fields with existing issue data
     elif request.method == 'GET':
+        # The form carries the version of the issue it was filled from
+        form.version.data = issue.version
         if user_type == 'employee':
             form.category.data = issue.category
             form.description.data = issue.description
@@ -286,6 +1165,15 @@ def update_issue(issue_id):
     # Render the update_issue.html template, passing in the form and user_type
     return render_template('update_issue.html', title='Update Issue', form=form, user_type=user_type)
 
+# This function renders the update form again with a 409 error when someone else changed the issue since it was loaded,
+# or the form did not say which version it was loaded from
+# The user's input is kept next to the current values, and the form now carries the current version, so submitting it
+# again applies the input on top of the other change
+def issue_update_conflict(issue, form, user_type, message='Someone else updated this issue while you were editing it. Check the current values and submit again to apply your changes.'):
+    form.version.raw_data, form.version.data = [], issue.version
+    flash(message, 'warning')
+    return make_response(render_template('update_issue.html', title='Update Issue', form=form, user_type=user_type, current=issue), 409)
+
 # Define a Flask route for deleting an issue
 @app.route('/issue/<int:issue_id>/delete', methods=['POST'])
 @login_required
@@ -293,12 +1181,18 @@ def delete_issue(issue_id):
     # Get the issue to be deleted
     issue = Issue.query.get_or_404(issue_id)
     # Check if the current user is the one who created the issue, else abort
-    if current_user.email != issue.employee_email:
+    if not is_issue_owner(issue):
         abort(403)
     # Delete the issue from the database
+    record_issue_change(issue_state(issue), None)
     db.session.delete(issue)
-    # Save changes to the database
-    db.session.commit()
+    # Save changes to the database, unless the issue was changed since it was loaded
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        flash('Someone else updated this issue in the meantime. Check the current values and delete it again.', 'warning')
+        return redirect(url_for('issue', issue_id=issue_id))
     # Show a success message
     flash('Your issue has been deleted!', 'success')
     # Redirect the user to their issues page
@@ -327,7 +1221,10 @@ def register():
             flash('That email is taken. Please choose a different one.', 'danger')
             return redirect(url_for('register'))
         # Generate a hashed version of the password
-        hashed_password = generate_password_hash(form.password.data, method='sha256')
+        try:
+            hashed_password = password_service.hash(form.password.data)
+        except PasswordServiceBusy:
+            return password_service_busy('register.html', title="Register", form=form)
         # Create a new user and employee with the form data
         user = Users(email=form.email.data, password=hashed_password)
         employee = Employee(employee_id=form.employee_id.data, name=form.name.data, email=form.email.data, phone=form.phone.data, location=form.location.data)
@@ -343,6 +1240,13 @@ def register():
     # Render the registration form
     return render_template('register.html', title="Register", form=form)
 
+# This function renders a form page again with a 503 error when the password service is too busy to hash a password
+def password_service_busy(template_name, **context):
+    flash('The server is busy. Please try again in a moment.', 'danger')
+    response = make_response(render_template(template_name, **context), 503)
+    response.headers['Retry-After'] = '1'
+    return response
+
 # Define Flask route for user log in
 @app.route('/login', methods=['GET', 'POST']) # route for user login
 def login():
@@ -357,10 +1261,34 @@ def login():
     form = LoginForm()
     # If form is submitted and validated
     if form.validate_on_submit():
+        # Refuse the attempt if the client address or the account has made too many failed attempts recently
+        client_key, account_key = request.remote_addr or '', form.email.data.lower()
+        retry_after = login_account_limiter.retry_after(account_key)
+        if app.config['LOGIN_IP_LIMIT']:
+            retry_after = max(retry_after, login_ip_limiter.retry_after(client_key))
+        if retry_after:
+            flash('Too many login attempts. Please try again in %d seconds.' % retry_after, 'danger')
+            response = make_response(render_template('login.html', title='Login', form=form), 429)
+            response.headers['Retry-After'] = str(retry_after)
+            return response
         # Query for user using email
         user = Users.query.filter_by(email=form.email.data).first()
+        # Check the password in the password service's pool; unknown emails are checked against a dummy hash
+        try:
+            password_correct = password_service.verify(user.password if user else None, form.password.data)
+        except PasswordServiceBusy:
+            return password_service_busy('login.html', title='Login', form=form)
         # If user exists and password is correct
-        if user and check_password_hash(user.password, form.password.data):
+        if user and password_correct:
+            login_account_limiter.reset(account_key)
+            # Replace a hash made with an older method, now that the password is known
+            if password_service.needs_rehash(user.password):
+                try:
+                    user.password = password_service.hash(form.password.data)
+                    db.session.commit()
+                except PasswordServiceBusy:
+                    # The hash is replaced on a later login instead
+                    pass
             # Log the user in
             login_user(user, remember=form.remember.data)
             # Get the next page the user was trying to access before login
@@ -373,7 +1301,10 @@ def login():
             elif user_type == 'support':
                 return redirect(next_page) if next_page else redirect(url_for('all_issues'))
         else:
-            # If login is unsuccessful, flash a danger message
+            # If login is unsuccessful, count the failed attempt against the client address and the account,
+            # and flash a danger message; successful logins never use up a limit, so a surge of them is not throttled
+            login_ip_limiter.hit(client_key)
+            login_account_limiter.hit(account_key)
             flash('Login Unsuccessful. Please check email and password', 'danger')
     # Render the login form
     return render_template('login.html', title='Login', form=form)
@@ -392,13 +1323,24 @@ def account():
         if request.form.get('action') == 'delete':  # If user chose to delete their account
             if user_type == 'employee':
                 # Fetch the corresponding Employee record
-                employee_user = Employee.query.filter_by(email=current_user.email).first()
+                employee_user = Employee.query.get(current_user.employee_id)
                 if employee_user:
+                    # Record the deletion of the employee's issues, which are deleted along with the Employee record
+                    for employee_issue in employee_user.issues:
+                        record_issue_change(issue_state(employee_issue), None)
+                    # Delete the employee's archived issues too
+                    archived_issues = ArchivedIssue.query.filter_by(employee_id=employee_user.employee_id)
+                    mark_issues_changed([ARCHIVE_TAG] + [issue_tag(issue_id) for issue_id, in archived_issues.with_entities(ArchivedIssue.issue_id)])
+                    archived_issues.delete(synchronize_session=False)
                     # Delete the Employee record
                     db.session.delete(employee_user)
             # Delete the User record
+            deleted_email = current_user.email
             db.session.delete(current_user)
             db.session.commit()
+            # Drop the cached type of user for the deleted account, and the cached lists of archived issues
+            forget_user_type(deleted_email)
+            page_cache.invalidate([ARCHIVE_TAG])
             flash('Your account has been deleted.', 'success')
             return redirect(url_for('login'))  # Redirect to the login page
         elif request.form.get('action') == 'update':  # If user chose to update their account
@@ -409,19 +1351,32 @@ def account():
             else:
                 # If the user has entered a new password, hash it and store it
                 if form.password.data:
-                    current_user.password = generate_password_hash(form.password.data, method='sha256')
+                    try:
+                        current_user.password = password_service.hash(form.password.data)
+                    except PasswordServiceBusy:
+                        return password_service_busy('account.html', title='Account', form=form, user_type=user_type)
                 old_email = current_user.email
+                changed_issue_ids = []
                 current_user.email = form.email.data  # Update the email of the User record
                 if user_type == 'employee':
                     # Fetch the corresponding Employee record
-                    employee_user = Employee.query.filter_by(email=old_email).first()
+                    employee_user = Employee.query.get(current_user.employee_id)
                     if employee_user:
                         # Update the email of the Employee record
                         employee_user.email = form.email.data
-                        # Update the employee_email field of all issues reported by this employee
-                        issues_to_update = Issue.query.filter_by(employee_email=old_email).all()
-                        for issue in issues_to_update:
-                            issue.employee_email = form.email.data
+                        # The cached details of the employee's issues show the old email
+                        changed_issue_ids = [issue_id for issue_id, in db.session.query(Issue.issue_id).filter_by(employee_id=employee_user.employee_id)]
+                        changed_issue_ids += [issue_id for issue_id, in db.session.query(ArchivedIssue.issue_id).filter_by(employee_id=employee_user.employee_id)]
+                        # Update the employee_email field of all issues reported by this employee, live and archived, in a single UPDATE statement each
+                        # Like any other change, it bumps the version and the time of the last change, which the API's validators are made from
+                        changed_at = datetime.utcnow()
+                        Issue.query.filter_by(employee_id=employee_user.employee_id)\
+                            .update({Issue.employee_email: form.email.data, Issue.version: Issue.version + 1, Issue.updated_at: changed_at},
+                                    synchronize_session=False)
+                        ArchivedIssue.query.filter_by(employee_id=employee_user.employee_id)\
+                            .update({ArchivedIssue.employee_email: form.email.data, ArchivedIssue.version: ArchivedIssue.version + 1,
+                                     ArchivedIssue.updated_at: changed_at}, synchronize_session=False)
+                        mark_issues_changed([issue_tag(issue_id) for issue_id in changed_issue_ids])
                 elif user_type == 'support':
                     # Fetch the corresponding SupportStaff record
                     support_user = SupportStaff.query.filter_by(email=old_email).first()
@@ -429,6 +1384,11 @@ def account():
                         # Update the email of the SupportStaff record
                         support_user.email = form.email.data
                 db.session.commit()
+                # Drop the cached type of user for both the old and the new email, and the cached details of the changed issues
+                if old_email != current_user.email:
+                    forget_user_type(old_email)
+                    forget_user_type(current_user.email)
+                    page_cache.invalidate(issue_tag(issue_id) for issue_id in changed_issue_ids)
                 flash('Your account has been updated!', 'success')
             return redirect(url_for('account'))  # Redirect to the account page
     elif request.method == 'GET':  # Pre-fill the form
@@ -455,32 +1415,522 @@ def logout():
     return redirect(url_for('login'))
 
 
-if __name__ == "__main__":
-    # Ensure the Flask application instance runs in the context
-    with app.app_context():
-        # Create the database tables based on SQLAlchemy models (if they don't exist)
-        db.create_all()      
-        # Check if the admin user already exists in the Users table
-        admin_user = Users.query.filter_by(email="admin@email.com").first()
-        # Check if the admin support staff already exists in the SupportStaff table
-        admin_staff = SupportStaff.query.filter_by(email="admin@email.com").first()
-        # If the admin user does not exist in the Users table
-        if admin_user is None:
-            # Hash the password "qwer1234" using the generate_password_hash function
-            hashed_password = generate_password_hash("qwer1234")
-            # Create a new Users instance for the admin user
-            admin_user = Users(email="admin@email.com", password=hashed_password)
-            # Add the new user to the session
-            db.session.add(admin_user)
-        # If the admin support staff does not exist in the SupportStaff table
-        if admin_staff is None:
-            # Create a new SupportStaff instance for the admin user
-            admin_staff = SupportStaff(name="Admin", email="admin@email.com")
-            # Add the new support staff to the session
-            db.session.add(admin_staff)
-        # Commit the changes to the database
+# JSON API, version 1
+# The API shares the permission rules of the HTML pages and is protected against CSRF like them: requests that change
+# issues must send the token from /api/v1/csrf-token in an X-CSRFToken header
+# GET responses carry ETag and Last-Modified validators, so polling clients get an empty 304 when nothing changed
+
+# Fields of an issue the API can return, and the fields of the list responses unless the client selects others
+API_ISSUE_FIELDS = tuple(Issue.__table__.columns.keys())
+API_LIST_FIELDS = tuple(column.key for column in ISSUE_LIST_COLUMNS)
+
+# This function returns a JSON error response
+def api_error(status, message, **details):
+    return jsonify(error=message, **details), status
+
+# This decorator answers requests that are not logged in with a JSON 401 error instead of a redirect to the login page
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return api_error(401, 'Login required.')
+        return view(*args, **kwargs)
+    return wrapper
+
+# This function reads the comma separated fields query string argument, falling back to the default fields
+# It raises ValueError for fields the API does not have
+def parse_api_fields(default):
+    value = request.args.get('fields', '').strip()
+    if not value:
+        return list(default)
+    fields = []
+    for field in value.split(','):
+        field = field.strip()
+        if field not in API_ISSUE_FIELDS:
+            raise ValueError('Unknown field: %s' % field)
+        if field not in fields:
+            fields.append(field)
+    return fields
+
+# This function converts an issue to a dict of the given fields, with times in ISO 8601 format
+def issue_to_json(issue, fields):
+    data = {}
+    for field in fields:
+        value = getattr(issue, field)
+        data[field] = value.isoformat() + 'Z' if isinstance(value, datetime) else value
+    return data
+
+# This function reads the form data of an API request from its JSON body, on top of the given current values
+# Only string values are taken, so the forms validate the request exactly as they validate a submitted page
+def api_form_data(current=None):
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return None
+    data = dict(current or {})
+    data.update((key, value) for key, value in body.items() if isinstance(value, str))
+    return MultiDict(data)
+
+# This function returns the issue version sent in an API request body as an integer, accepting a string of digits too,
+# or None if it is missing or not an integer
+def api_issue_version(body):
+    version = body.get('version')
+    if isinstance(version, bool) or not isinstance(version, (int, str)):
+        return None
+    try:
+        return int(version)
+    except ValueError:
+        return None
+
+# This function returns the 409 error for an update of an issue that someone else changed, with the issue's current fields
+def api_issue_conflict(issue):
+    return api_error(409, 'The issue was changed by someone else. Apply your change to the current issue and send it again.',
+                     issue=issue_to_json(issue, API_ISSUE_FIELDS))
+
+# This function returns the version and change time of the issue change marker
+def read_issue_change_marker():
+    marker = db.session.query(IssueChangeMarker.version, IssueChangeMarker.changed_at).filter(IssueChangeMarker.marker_id == 1).first()
+    return marker if marker is not None else (0, None)
+
+# This function returns (current version of the issue change marker, page cache tags changed since version) for the
+# per-process page cache, read from the primary so a lagging replica never hides a change
+# The tags are None when the issue change log cannot tell which entries changed: on the first lookup, when version is
+# older than the log's oldest row, or when a change affected every entry
+def issue_changes_since(version):
+    def read():
+        current = read_issue_change_marker()[0]
+        if current == version:
+            return current, []
+        if version is None or current < version:
+            return current, None
+        rows = db.session.query(IssueChangeLog.tags).filter(IssueChangeLog.version > version, IssueChangeLog.version <= current).all()
+        if len(rows) != current - version or any(tags is None for tags, in rows):
+            return current, None
+        return current, {tag for tags, in rows for tag in json.loads(tags)}
+    return read_from_primary(db.session, read)
+
+# Define a Flask route handing the CSRF token for the API's POST and PATCH requests to the logged-in client
+@app.route('/api/v1/csrf-token')
+@api_login_required
+def api_csrf_token():
+    return jsonify(csrf_token=generate_csrf())
+
+# Define a Flask route listing issues as JSON: every issue for support staff, their own issues for employees
+# It takes the filters, sort order, page size and cursor of the issue pages, plus a comma separated list of fields
+@app.route('/api/v1/issues', methods=['GET'])
+@api_login_required
+def api_list_issues():
+    user_type = get_user_type(current_user.email)
+    if user_type == 'support':
+        criteria = ()
+    elif user_type == 'employee':
+        criteria = (Issue.employee_id == current_user.employee_id,)
+    else:
+        return api_error(403, 'You do not have the necessary permissions to list issues.')
+    try:
+        fields = parse_api_fields(API_LIST_FIELDS)
+    except ValueError as error:
+        return api_error(400, str(error))
+    params = parse_list_args(request.args)
+    # The list only changes when the issues do, so it is identified by the change marker and the request
+    version, changed_at = read_issue_change_marker()
+    etag = make_etag('v1', 'issues', version, user_type, current_user.employee_id, params, fields)
+    if is_not_modified(request, etag, changed_at):
+        return not_modified_response(etag, changed_at)
+    # Select the requested fields, plus the columns the cursor of the next page is built from
+    column_names = list(fields)
+    for column_name in ('issue_id', SORT_OPTIONS[params.sort][0]):
+        if column_name not in column_names:
+            column_names.append(column_name)
+    query = Issue.query.with_entities(*[getattr(Issue, column_name) for column_name in column_names]).filter(*criteria)
+    issues, next_cursor = split_page(build_page_query(query, Issue, params).all(), params)
+    response = jsonify(issues=[issue_to_json(issue, fields) for issue in issues], next_cursor=next_cursor)
+    # Point at the next page with a Link header too, keeping the current query string
+    if next_cursor:
+        response.headers['Link'] = '<%s>; rel="next"' % url_for('api_list_issues', **dict(request.args.items(), cursor=next_cursor))
+    return add_validators(response, etag, changed_at)
+
+# Define a Flask route creating an issue from JSON, for employees like the new issue page
+@app.route('/api/v1/issues', methods=['POST'])
+@api_login_required
+def api_create_issue():
+    if get_user_type(current_user.email) != 'employee':
+        return api_error(403, 'Only employees can report issues.')
+    formdata = api_form_data()
+    if formdata is None:
+        return api_error(400, 'The request body must be a JSON object.')
+    # The CSRF token was already checked for the request as a whole
+    form = IssueFormEmployee(formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        return api_error(400, 'Invalid issue.', fields=form.errors)
+    issue = create_issue(form)
+    db.session.commit()
+    response = jsonify(issue=issue_to_json(issue, API_ISSUE_FIELDS))
+    response.headers['Location'] = url_for('api_get_issue', issue_id=issue.issue_id)
+    return response, 201
+
+# Define a Flask route returning an issue as JSON, for the same users as the issue page
+@app.route('/api/v1/issues/<int:issue_id>', methods=['GET'])
+@api_login_required
+def api_get_issue(issue_id):
+    issue = cached_load(['issue', issue_id], [issue_tag(issue_id)], lambda: load_issue_record(issue_id))
+    if issue is None:
+        return api_error(404, 'Issue not found.')
+    if not can_access_issue(issue, get_user_type(current_user.email)):
+        return api_error(403, 'You do not have the necessary permissions to view this issue.')
+    try:
+        fields = parse_api_fields(API_ISSUE_FIELDS)
+    except ValueError as error:
+        return api_error(400, str(error))
+    # An issue is identified by its version, which every change increments, and by whether it has been archived
+    etag = make_etag('v1', 'issue', issue_id, issue.version, issue.archived, fields)
+    if is_not_modified(request, etag, issue.updated_at):
+        return not_modified_response(etag, issue.updated_at)
+    return add_validators(jsonify(issue=issue_to_json(issue, fields)), etag, issue.updated_at)
+
+# Define a Flask route updating an issue from JSON, with the rules of the update issue page
+# Employees can change the category and description of their issues, support staff the status of any issue
+# Fields left out of the request keep their current values
+@app.route('/api/v1/issues/<int:issue_id>', methods=['PATCH'])
+@api_login_required
+def api_update_issue(issue_id):
+    issue = Issue.query.get(issue_id)
+    if issue is None:
+        return api_error(404, 'Issue not found.')
+    user_type = get_user_type(current_user.email)
+    if not can_access_issue(issue, user_type):
+        return api_error(403, 'You do not have the necessary permissions to update this issue.')
+    if user_type == 'employee':
+        formdata = api_form_data({'category': issue.category, 'description': issue.description})
+        form_class = IssueFormEmployee
+    else:
+        formdata = api_form_data({'status': issue.status})
+        form_class = IssueFormSupport
+    if formdata is None:
+        return api_error(400, 'The request body must be a JSON object.')
+    form = form_class(formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        return api_error(400, 'Invalid issue.', fields=form.errors)
+    # The client sends the version of the issue it read, and only updates the issue if nobody changed it since
+    expected_version = api_issue_version(request.get_json())
+    if expected_version is None:
+        return api_error(400, 'Invalid issue.', fields={'version': ['The version of the issue you read is required, as an integer.']})
+    if expected_version != issue.version:
+        return api_issue_conflict(issue)
+    apply_issue_update(issue, user_type, form)
+    try:
         db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        issue = Issue.query.get(issue_id)
+        if issue is None:
+            return api_error(404, 'Issue not found.')
+        return api_issue_conflict(issue)
+    return jsonify(issue=issue_to_json(issue, API_ISSUE_FIELDS))
+
 
+# Define a Flask route for the liveness probe: the process is up and serving requests
+# It does no database work, so a slow or unavailable database never gets the process restarted
+@app.route('/healthz')
+def healthz():
+    return jsonify(status='ok')
+
+# Define a Flask route for the readiness probe: the database and every read replica answer a trivial query
+# on a pooled connection, so the instance only receives traffic while it can serve it
+@app.route('/readyz')
+def readyz():
+    checks = {}
+    for name, engine in [('primary', db.engine)] + [('replica_%d' % number, engine) for number, engine in enumerate(replica_engines)]:
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+            checks[name] = {'status': 'ok', 'pool': engine.pool.status()}
+        except SQLAlchemyError as error:
+            checks[name] = {'status': 'unavailable', 'error': error.__class__.__name__}
+    ready = all(check['status'] == 'ok' for check in checks.values())
+    return jsonify(status='ready' if ready else 'unavailable', checks=checks), 200 if ready else 503
+
+
+# This function creates a support staff member with a user account, and returns False if the email is taken already
+# The caller commits; an account created concurrently by another process is detected by the unique emails
+def create_support_staff(name, email, password):
+    if Users.query.filter_by(email=email).first() or SupportStaff.query.filter_by(email=email).first():
+        return False
+    try:
+        with db.session.begin_nested():
+            db.session.add(Users(email=email, password=password_service.hash(password)))
+            db.session.add(SupportStaff(name=name, email=email))
+    except IntegrityError:
+        return False
+    return True
+
+# Define a Flask CLI command that creates the admin support staff account, unless it exists (flask create-admin)
+# The password is read from ADMIN_PASSWORD, or prompted for
+@app.cli.command('create-admin')
+@click.option('--email', default='admin@email.com', show_default=True, help='Email the admin logs in with.')
+@click.option('--name', default='Admin', show_default=True, help='Name of the admin support staff member.')
+@click.option('--password', envvar='ADMIN_PASSWORD', prompt=True, hide_input=True, confirmation_prompt=True,
+              help='Password of the admin account [env: ADMIN_PASSWORD].')
+def create_admin_command(email, name, password):
+    if create_support_staff(name, email, password):
+        db.session.commit()
+        click.echo('Created the admin account %s.' % email)
+    else:
+        click.echo('An account for %s exists already.' % email)
+
+# Define a Flask CLI command that creates support staff members from a CSV or NDJSON file (flask create-support-from-file FILE)
+# Every record has a name, an email and optionally a password; members without a password get a random one,
+# which is printed so it can be handed out. Existing accounts are left alone and reported, so the command can be run again
+@app.cli.command('create-support-from-file')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(sorted(FORMATS)), default=None, help='File format, taken from the extension by default.')
+def create_support_from_file_command(path, fmt):
+    fmt = fmt or path.rsplit('.', 1)[-1].lower()
+    if fmt not in FORMATS:
+        raise click.UsageError('Unknown file format, use --format.')
+    created, existing, skipped = 0, 0, 0
+    with open(path, encoding='utf-8', newline='') as text_stream:
+        for line_number, record in read_records(text_stream, fmt):
+            name = str((record or {}).get('name') or '').strip()
+            email = str((record or {}).get('email') or '').strip()
+            password = str((record or {}).get('password') or '').strip()
+            if not name or '@' not in email:
+                click.echo('Line %d was skipped: a name and an email are required' % line_number, err=True)
+                skipped += 1
+                continue
+            # Issues are assigned by name, so two members must never share one
+            if SupportStaff.query.filter(SupportStaff.name == name, SupportStaff.email != email).first():
+                click.echo('Line %d was skipped: the name %s is taken' % (line_number, name), err=True)
+                skipped += 1
+                continue
+            generated = not password
+            if generated:
+                password = secrets.token_urlsafe(12)
+            if not create_support_staff(name, email, password):
+                click.echo('Line %d was skipped: an account for %s exists already and was not updated' % (line_number, email), err=True)
+                existing += 1
+                continue
+            # Commit every member on their own, so a failure halfway keeps the members created so far
+            db.session.commit()
+            created += 1
+            if generated:
+                click.echo('%s\t%s' % (email, password))
+    click.echo('%d support staff members created, %d existed already and were not updated, %d skipped.' % (created, existing, skipped), err=True)
+
+# Define a Flask CLI command that removes data nothing refers to any more (flask cleanup)
+# Removes user accounts of neither an employee nor a support staff member and empty dashboard counters, and with
+# --purge-archived-days also the archived issues archived more than that many days ago, in batches
+@app.cli.command('cleanup')
+@click.option('--purge-archived-days', type=int, default=None, help='Delete archived issues archived more than this many days ago.')
+@click.option('--batch-size', type=int, default=1000, show_default=True, help='Archived issues deleted per transaction.')
+@click.option('--dry-run', is_flag=True, help='Only report what would be removed.')
+def cleanup_command(purge_archived_days, batch_size, dry_run):
+    orphaned_users = Users.query.filter(~Employee.query.filter(Employee.email == Users.email).exists(),
+                                        ~SupportStaff.query.filter(SupportStaff.email == Users.email).exists())
+    empty_counters = IssueCounter.query.filter(IssueCounter.count <= 0)
+    if dry_run:
+        click.echo('Would remove %d orphaned user accounts and %d empty issue counters.' % (orphaned_users.count(), empty_counters.count()))
+    else:
+        users = orphaned_users.delete(synchronize_session=False)
+        counters = empty_counters.delete(synchronize_session=False)
+        db.session.commit()
+        click.echo('Removed %d orphaned user accounts and %d empty issue counters.' % (users, counters))
+    if purge_archived_days is None:
+        return
+    cutoff = datetime.utcnow() - timedelta(days=purge_archived_days)
+    expired = ArchivedIssue.query.filter(ArchivedIssue.archived_at < cutoff)
+    if dry_run:
+        click.echo('Would delete %d archived issues archived before %s.' % (expired.count(), cutoff.strftime('%Y-%m-%d %H:%M')))
+        return
+    deleted = 0
+    while True:
+        issue_ids = [issue_id for issue_id, in expired.with_entities(ArchivedIssue.issue_id).limit(batch_size)]
+        if not issue_ids:
+            break
+        deleted += ArchivedIssue.query.filter(ArchivedIssue.issue_id.in_(issue_ids)).delete(synchronize_session=False)
+        # The workers' cached lists of archived issues and details of the deleted issues are dropped through the issue change log
+        mark_issues_changed([ARCHIVE_TAG] + [issue_tag(issue_id) for issue_id in issue_ids])
+        db.session.commit()
+    page_cache.invalidate([ARCHIVE_TAG])
+    click.echo('Deleted %d archived issues archived before %s.' % (deleted, cutoff.strftime('%Y-%m-%d %H:%M')))
+
+# Define a Flask CLI command that applies the pending schema migrations (flask upgrade-db)
+@app.cli.command('upgrade-db')
+@click.option('--to', 'target', type=int, default=None, help='Stop after this migration version.')
+def upgrade_db_command(target):
+    applied = upgrade(db.engine, db.metadata, target=target)
+    for version, description in applied:
+        click.echo('Applied migration %d: %s' % (version, description))
+    if not applied:
+        click.echo('The database schema is up to date.')
+
+# Define a Flask CLI command that downloads the vendored static files, such as Bootstrap, again (flask fetch-vendor-assets)
+# The files are committed to the static folder; it is only needed when upgrading them, after changing VENDOR_ASSETS
+@app.cli.command('fetch-vendor-assets')
+def fetch_vendor_assets_command():
+    for path in fetch_vendor_assets(app.static_folder):
+        click.echo('Downloaded %s' % path)
+
+# Define a Flask CLI command that imports issues from a CSV or NDJSON file (flask import-issues FILE)
+@app.cli.command('import-issues')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(sorted(FORMATS)), default=None, help='File format, taken from the extension by default.')
+def import_issues_command(path, fmt):
+    fmt = fmt or path.rsplit('.', 1)[-1].lower()
+    if fmt not in FORMATS:
+        raise click.UsageError('Unknown file format, use --format.')
+    with open(path, encoding='utf-8', newline='') as text_stream:
+        imported, errors = import_issues(text_stream, fmt)
+    for line_number, error in errors:
+        click.echo('Line %d was skipped: %s' % (line_number, error), err=True)
+    click.echo('%d issues have been imported.' % imported)
+
+# Define a Flask CLI command that fills the database with synthetic employees, support staff and issues (flask seed-data)
+# Every generated account has the password SEED_PASSWORD; rows are bulk inserted in batches, one transaction per batch
+@app.cli.command('seed-data')
+@click.option('--employees', default=1000, show_default=True, help='Number of employees to generate.')
+@click.option('--support', default=20, show_default=True, help='Number of support staff members to generate.')
+@click.option('--issues', default=100000, show_default=True, help='Number of issues to generate.')
+@click.option('--seed', default=0, show_default=True, help='Random seed, the same seed always generates the same data.')
+@click.option('--skew', default=1.1, show_default=True, help='Zipf exponent of the issues per employee distribution.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows inserted per statement and transaction.')
+def seed_data_command(employees, support, issues, seed, skew, batch_size):
+    # The generated emails are fixed, so the data can only be generated once per database
+    if Users.query.filter_by(email=employee_email(0)).first():
+        raise click.ClickException('The database already contains generated data.')
+    started = time.perf_counter()
+    first_employee_id = (db.session.query(func.max(Employee.employee_id)).scalar() or 0) + 1
+    data = SyntheticData(employees, support, issues, seed=seed, skew=skew, first_employee_id=first_employee_id)
+    employee_rows = {row['employee_id']: row for row in data.employee_rows()}
+    # All generated accounts share one password, so it is only hashed once
+    password_hash = password_service.hash(SEED_PASSWORD)
+    for table, rows in ((Employee.__table__, employee_rows.values()), (SupportStaff.__table__, data.support_rows()),
+                        (Users.__table__, data.user_rows(password_hash)), (Issue.__table__, data.issue_rows(employee_rows))):
+        inserted = 0
+        for chunk in chunked(rows, batch_size):
+            db.session.execute(table.insert(), chunk)
+            db.session.commit()
+            inserted += len(chunk)
+        click.echo('Inserted %d rows into %s' % (inserted, table.name))
+    # The assignment engine's counters are seeded again on the next pick, and the dashboard counters are rebuilt
+    assignment_engine.reset()
+    reconcile_counters(db.session, IssueCounter.__table__, Issue.__table__)
+    mark_issues_changed()
+    db.session.commit()
+    click.echo('Done in %.1f seconds. Every generated account has the password "%s".' % (time.perf_counter() - started, SEED_PASSWORD))
+
+# This function moves up to batch_size issues resolved before cutoff from the issues table to the archive,
+# in one short transaction, and returns the number moved
+# Issues locked by other transactions are skipped on Postgres, so archiving never waits on the application
+def archive_issue_batch(cutoff, batch_size):
+    rows = db.session.query(Issue.issue_id, Issue.employee_id, Issue.status, Issue.category, Issue.location, Issue.support_name)\
+            .filter(closed_issues_clause(Issue), Issue.resolved_at < cutoff)\
+            .order_by(Issue.resolved_at, Issue.issue_id).limit(batch_size).with_for_update(skip_locked=True).all()
+    if not rows:
+        return 0
+    issue_ids = [row.issue_id for row in rows]
+    issues = Issue.__table__
+    # Copy the issues to the archive and delete them, with one INSERT ... SELECT and one DELETE statement
+    columns = [issues.c[name] for name in ISSUE_COLUMN_NAMES]
+    db.session.execute(ArchivedIssue.__table__.insert().from_select(
+        ISSUE_COLUMN_NAMES + ['archived_at'],
+        select(*columns, literal(datetime.utcnow(), db.DateTime)).where(issues.c.issue_id.in_(issue_ids))))
+    db.session.execute(issues.delete().where(issues.c.issue_id.in_(issue_ids)))
+    # The issues leave the live set, which the counters, caches and assignment engine track, and join the archived lists
+    for row in rows:
+        record_issue_change(IssueState(*row), None)
+    mark_issues_changed([ARCHIVE_TAG])
+    db.session.commit()
+    page_cache.invalidate([ARCHIVE_TAG])
+    return len(rows)
+
+# Define a Flask CLI command that moves issues resolved more than ARCHIVE_AFTER_DAYS days ago to the archive (flask archive-issues)
+# It works in batches, each in its own short transaction, and is meant to be run on a schedule, e.g. nightly from cron
+@app.cli.command('archive-issues')
+@click.option('--older-than-days', type=int, default=None, help='Archive issues resolved more than this many days ago [default: ARCHIVE_AFTER_DAYS].')
+@click.option('--batch-size', type=int, default=1000, show_default=True, help='Number of issues moved per transaction.')
+@click.option('--pause', type=float, default=0.1, show_default=True, help='Seconds to wait between batches.')
+@click.option('--max-batches', type=int, default=0, help='Stop after this many batches, 0 for no limit.')
+def archive_issues_command(older_than_days, batch_size, pause, max_batches):
+    if older_than_days is None:
+        older_than_days = app.config['ARCHIVE_AFTER_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived, batches = 0, 0
+    while True:
+        moved = archive_issue_batch(cutoff, batch_size)
+        archived += moved
+        batches += 1
+        if moved < batch_size or (max_batches and batches >= max_batches):
+            break
+        # Give the application's transactions room between batches
+        time.sleep(pause)
+    click.echo('Archived %d issues resolved before %s.' % (archived, cutoff.strftime('%Y-%m-%d %H:%M')))
+
+# Define a Flask CLI command that corrects any drift of the dashboard counters against the issues (flask reconcile-counters)
+# With --interval it keeps running and reconciles periodically, e.g. as a sidecar process
+@app.cli.command('reconcile-counters')
+@click.option('--interval', type=int, default=0, help='Reconcile again every this many seconds instead of exiting.')
+def reconcile_counters_command(interval):
+    while True:
+        corrected = reconcile_counters(db.session, IssueCounter.__table__, Issue.__table__)
+        db.session.commit()
+        click.echo('Corrected %d issue counters.' % corrected)
+        if not interval:
+            break
+        time.sleep(interval)
+
+# Define a Flask CLI command that prints the migration version of the database (flask db-version)
+@app.cli.command('db-version')
+def db_version_command():
+    with db.engine.begin() as connection:
+        click.echo(current_version(connection))
+
+# This function returns the (name, query, index names) checks run by the explain-queries command
+# Every query is built the same way the corresponding route builds it
+def route_query_checks():
+    # List parameters as a route would read them from the query string
+    def list_params(**args):
+        return parse_list_args(MultiDict(args))
+    # Unique constraints are indexed under these names on Postgres and SQLite respectively
+    employee_email = ('employees_email_key', 'sqlite_autoindex_employees')
+    support_email = ('support_staff_email_key', 'sqlite_autoindex_support_staff')
+    return [
+        ('get_user_type: employee by email', db.session.query(Employee.query.filter_by(email='x').exists()), employee_email),
+        ('get_user_type: support staff by email', db.session.query(SupportStaff.query.filter_by(email='x').exists()), support_email),
+        ('my_issues', build_issue_list_query(list_params(), Issue.employee_id == 1), ('ix_issues_employee_id',)),
+        ('all_issues: status', build_issue_list_query(list_params(status='Reported')), ('ix_issues_status',)),
+        ('all_issues: status and category', build_issue_list_query(list_params(status='Reported', category='Network')), ('ix_issues_status_category',)),
+        ('all_issues: category', build_issue_list_query(list_params(category='Network')), ('ix_issues_category',)),
+        ('all_issues: location', build_issue_list_query(list_params(location='B')), ('ix_issues_location',)),
+        ('all_issues: assigned to', build_issue_list_query(list_params(support_name='Admin')), ('ix_issues_support_name',)),
+        ('all_issues: open', build_issue_list_query(list_params(status=OPEN_STATUS_FILTER)), ('ix_issues_open',)),
+        # The sorted lists must read their pages in the order of the index, past the cursor, without sorting the issues
+        ('all_issues: sorted by status', build_issue_list_query(list_params(sort='status', cursor=encode_cursor(['Reported', 1]))), ('ix_issues_status',), True),
+        ('all_issues: sorted by location', build_issue_list_query(list_params(sort='location', cursor=encode_cursor(['B', 1]))), ('ix_issues_location',), True),
+        ('all_issues: status, sorted by category', build_issue_list_query(list_params(status='Reported', sort='category')), ('ix_issues_status_category',), True),
+        ('search_issues', build_issue_search_query('printer', 1), ('ix_issues_search', 'issues_fts')),
+        ('add_issue: support workload', load_support_workload_query(), ('ix_issues_open_support', 'ix_issues_support_name')),
+        ('archive-issues: resolved before cutoff', db.session.query(Issue.issue_id).filter(closed_issues_clause(Issue), Issue.resolved_at < datetime(2000, 1, 1))
+            .order_by(Issue.resolved_at, Issue.issue_id).limit(1000), ('ix_issues_resolved',)),
+        ('my_issues: archived', build_issue_list_query(list_params(), ArchivedIssue.employee_id == 1, model=ArchivedIssue), ('ix_issues_archive_employee_id',)),
+    ]
+
+# Define a Flask CLI command that checks the query plans of the routes' queries use the indexes (flask explain-queries)
+@app.cli.command('explain-queries')
+@click.option('--verbose', is_flag=True, help='Print the plan of every query, not only the failing ones.')
+def explain_queries_command(verbose):
+    results = check_plans(db.engine, route_query_checks())
+    for name, passed, plan in results:
+        click.echo('%s  %s' % ('ok  ' if passed else 'FAIL', name))
+        if verbose or not passed:
+            for line in plan:
+                click.echo('        ' + line)
+    # Exit with an error status if any query does not use its index
+    if not all(passed for name, passed, plan in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    # Startup does no database work: create the schema with flask upgrade-db and the admin account with flask create-admin
     # Run the Flask development server with Docker
     app.run(host='0.0.0.0', port=5000)
 
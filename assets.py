@@ -0,0 +1,196 @@
+# Import necessary libraries for serving the static files under fingerprinted URLs and compressing the responses
+# base64 and hashlib for the fingerprints and the integrity checks of the vendored files
+import base64
+import hashlib
+# gzip for compressing the responses, mimetypes for the content types of the static files
+import gzip
+import mimetypes
+import os
+# Lock guards the manifest, which the threads of a worker process share
+from threading import Lock
+# urlopen for downloading the vendored files
+from urllib.request import urlopen
+# abort, request, url_for and Response from flask for the asset route and the asset_url template helper
+from flask import abort, request, url_for, Response
+# safe_join keeps the asset route from reading files outside of the static folder
+from werkzeug.security import safe_join
+
+# brotli is optional: without it, responses are only compressed with gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Cache-Control of a fingerprinted static file: its URL changes with its content, so it may be kept for a year
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Content types worth compressing; images and fonts are compressed already
+COMPRESSIBLE_TYPES = ('text/css', 'text/javascript', 'application/javascript', 'image/svg+xml')
+
+# Third party files committed to the static folder, by path within it: the URL they were downloaded from and the
+# Subresource Integrity hash the download must match, for downloading them again when they are upgraded
+VENDOR_ASSETS = {
+    'vendor/bootstrap-4.0.0.min.css': ('https://maxcdn.bootstrapcdn.com/bootstrap/4.0.0/css/bootstrap.min.css',
+                                       'sha384-Gn5384xqQ1aoWXA+058RXPxPg6fy4IWvTNh0E263XmFcJlSAwiGgFAW/dAiS6JXm'),
+}
+
+
+# This function returns the Subresource Integrity hash of a file's content, e.g. 'sha384-...'
+def integrity_hash(body, algorithm='sha384'):
+    return '%s-%s' % (algorithm, base64.b64encode(hashlib.new(algorithm, body).digest()).decode())
+
+
+# This function downloads the vendored files into the static folder, checking each against its integrity hash
+# It yields the path of every file written, and raises ValueError for a download that does not match
+def fetch_vendor_assets(static_folder, assets=VENDOR_ASSETS, opener=urlopen):
+    for filename, (url, integrity) in sorted(assets.items()):
+        with opener(url) as download:
+            body = download.read()
+        if integrity_hash(body, integrity.split('-', 1)[0]) != integrity:
+            raise ValueError('%s does not match its integrity hash %s' % (url, integrity))
+        path = os.path.join(static_folder, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first, so a worker never reads a partly written file
+        with open(path + '.tmp', 'wb') as output:
+            output.write(body)
+        os.replace(path + '.tmp', path)
+        yield path
+
+
+# This function compresses a response body with the given content encoding, 'br' or 'gzip'
+def compress(body, encoding, level):
+    if encoding == 'br':
+        # Brotli's quality goes up to 11, gzip's level up to 9
+        return brotli.compress(body, quality=min(level + 2, 11))
+    # A fixed modification time keeps the output, and so the precompressed static files, the same across processes
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+# This function returns the best content encoding among the available ones that the client accepts, or None
+# Brotli is preferred over gzip when the client accepts both equally
+def choose_encoding(accept_encodings, available):
+    accepted = [encoding for encoding in ('br', 'gzip') if encoding in available and accept_encodings[encoding] > 0]
+    return max(accepted, key=lambda encoding: accept_encodings[encoding], default=None)
+
+
+# A static file as served: its fingerprint, content type and content in every encoding it is available in
+class StaticAsset(object):
+    def __init__(self, filename, body, mtime, min_size, level):
+        self.filename = filename
+        self.mtime = mtime
+        # Fingerprint of the content, part of the file's URL
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self.bodies = {None: body}
+        # Compress the file once, with the highest level, rather than on every request
+        if self.mimetype in COMPRESSIBLE_TYPES and len(body) >= min_size:
+            for encoding in ('br', 'gzip') if brotli is not None else ('gzip',):
+                compressed = compress(body, encoding, 9)
+                if len(compressed) < len(body):
+                    self.bodies[encoding] = compressed
+
+
+# Serves the files of the static folder under URLs that contain a fingerprint of their content, so browsers and
+# proxies may cache them for a year, and compresses the HTML and JSON responses of the application
+# The manifest of fingerprints is built as the files are first linked, and kept per worker process
+class AssetPipeline(object):
+    def __init__(self, app=None):
+        self._assets = {}
+        self._lock = Lock()
+        # Counters reported by stats()
+        self.compressed = 0
+        self.bytes_saved = 0
+        if app is not None:
+            self.init_app(app)
+
+    # This method hooks the asset route, the asset_url template helper and the response compression into the application
+    def init_app(self, app):
+        # Responses smaller than this many bytes are sent as they are, compressing them gains little
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        # gzip level of the HTML and JSON responses, which are compressed on every request
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_MIMETYPES', ('text/html', 'application/json'))
+        # Check the static files for changes whenever they are linked, for development
+        app.config.setdefault('ASSETS_RELOAD', False)
+        self.app = app
+        app.add_url_rule('/assets/<digest>/<path:filename>', 'asset', self._asset_view)
+        app.add_template_global(self.asset_url)
+        app.after_request(self._compress_response)
+
+    # This method returns the static file at the path within the static folder, or None if there is no such file
+    def get(self, filename):
+        asset = self._assets.get(filename, False)
+        if asset is False or self.app.config['ASSETS_RELOAD']:
+            asset = self._load(filename, asset or None)
+            with self._lock:
+                self._assets[filename] = asset
+        return asset
+
+    def _load(self, filename, current):
+        path = safe_join(self.app.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        mtime = os.stat(path).st_mtime_ns
+        if current is not None and current.mtime == mtime:
+            return current
+        with open(path, 'rb') as source:
+            body = source.read()
+        return StaticAsset(filename, body, mtime, self.app.config['COMPRESS_MIN_SIZE'], 9)
+
+    # This method returns the fingerprinted URL of a static file for the templates
+    # A file missing from the static folder keeps its plain static URL, which answers 404 like any other missing file
+    def asset_url(self, filename):
+        asset = self.get(filename)
+        if asset is not None:
+            return url_for('asset', digest=asset.digest, filename=filename)
+        return url_for('static', filename=filename)
+
+    def _asset_view(self, digest, filename):
+        asset = self.get(filename)
+        if asset is None:
+            abort(404)
+        encoding = choose_encoding(request.accept_encodings, asset.bodies)
+        response = Response(asset.bodies[encoding], mimetype=asset.mimetype)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        if len(asset.bodies) > 1:
+            response.vary.add('Accept-Encoding')
+        response.set_etag(asset.digest)
+        # A page rendered before the file changed asks for an older fingerprint: it gets the current content,
+        # which must not be cached under the old URL
+        if digest == asset.digest:
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers['Cache-Control'] = 'public, no-cache'
+        return response.make_conditional(request)
+
+    # This method compresses an HTML or JSON response with the best encoding the client accepts
+    # Streamed responses, such as the exports and the event streams, are sent as they are
+    def _compress_response(self, response):
+        if (response.direct_passthrough or response.is_streamed or response.status_code in (204, 304)
+                or response.status_code < 200 or 'Content-Encoding' in response.headers
+                or response.mimetype not in self.app.config['COMPRESS_MIMETYPES']):
+            return response
+        body = response.get_data()
+        if len(body) < self.app.config['COMPRESS_MIN_SIZE']:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings, ('br', 'gzip') if brotli is not None else ('gzip',))
+        if encoding is None:
+            return response
+        compressed = compress(body, encoding, self.app.config['COMPRESS_LEVEL'])
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        # The compressed body differs from the one the ETag was made for, so the ETag is only a weak validator now
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        with self._lock:
+            self.compressed += 1
+            self.bytes_saved += len(body) - len(compressed)
+        return response
+
+    # This method returns the number of static files in the manifest, and the compressed responses and bytes saved
+    def stats(self):
+        with self._lock:
+            return {'assets': sum(1 for asset in self._assets.values() if asset is not None),
+                    'compressed_responses': self.compressed, 'compressed_bytes_saved': self.bytes_saved}
@@ -0,0 +1,174 @@
+# Import necessary libraries for assigning new issues to support staff
+# heapq keeps the support staff ordered by their number of open issues
+import heapq
+# Lock makes the engine safe to share between the threads of a worker process
+from threading import Lock
+# time.monotonic is used to decide when the counters are seeded again
+import time
+
+# Statuses for which an issue no longer counts towards its assignee's open queue
+CLOSED_STATUSES = ('Resolved',)
+# How many more open issues than the least loaded agent an agent may have and still win on location affinity
+AFFINITY_SLACK = 2
+
+
+# This function tells whether an issue in the given status counts as open
+def is_open(status):
+    return status not in CLOSED_STATUSES
+
+
+# In-memory open-issue counters for every support staff member, overall and per location
+class LoadTracker(object):
+    def __init__(self):
+        # Open issues per support staff name
+        self.counts = {}
+        # Open issues per location, per support staff name
+        self.by_location = {}
+        # Min-heap of (open issues, name) entries; entries whose count is out of date are skipped lazily
+        self._heap = []
+        # Support staff names in a stable order, used by the round-robin strategy
+        self.names = []
+
+    # This method adds a support staff member with no open issues, if they are not tracked yet
+    def add_agent(self, name):
+        if name not in self.counts:
+            self.counts[name] = 0
+            self.names.append(name)
+            heapq.heappush(self._heap, (0, name))
+
+    # This method adds delta to the open issues of a support staff member at a location
+    def adjust(self, name, location, delta):
+        if name not in self.counts:
+            # Issues assigned to someone who is no longer a support staff member are not tracked
+            return
+        self.counts[name] = max(0, self.counts[name] + delta)
+        at_location = self.by_location.setdefault(location, {})
+        at_location[name] = max(0, at_location.get(name, 0) + delta)
+        if not at_location[name]:
+            del at_location[name]
+        heapq.heappush(self._heap, (self.counts[name], name))
+        # Rebuild the heap once stale entries outnumber the live ones
+        if len(self._heap) > 2 * len(self.counts) + 64:
+            self._heap = [(count, agent) for agent, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    # This method returns the name of the support staff member with the fewest open issues
+    def least_loaded(self):
+        while self._heap:
+            count, name = self._heap[0]
+            if self.counts.get(name) == count:
+                return name
+            # The entry is out of date, a newer one for the same name is further down the heap
+            heapq.heappop(self._heap)
+        return None
+
+
+# Strategy that hands out issues to the support staff in turn
+class RoundRobinStrategy(object):
+    def __init__(self):
+        self._position = 0
+
+    def pick(self, tracker, location):
+        if not tracker.names:
+            return None
+        name = tracker.names[self._position % len(tracker.names)]
+        self._position += 1
+        return name
+
+
+# Strategy that hands out issues to the support staff member with the fewest open issues
+class LeastOpenStrategy(object):
+    def pick(self, tracker, location):
+        return tracker.least_loaded()
+
+
+# Strategy that prefers a support staff member already working on open issues at the same location,
+# as long as they are not much busier than the least loaded one
+class LocationAffinityStrategy(object):
+    def pick(self, tracker, location):
+        least_loaded = tracker.least_loaded()
+        if least_loaded is None:
+            return None
+        local = tracker.by_location.get(location)
+        if local:
+            # The least busy of the support staff already working at this location
+            candidate = min(local, key=lambda name: (tracker.counts[name], name))
+            if tracker.counts[candidate] <= tracker.counts[least_loaded] + AFFINITY_SLACK:
+                return candidate
+        return least_loaded
+
+
+# Assignment strategies that can be selected through the ASSIGNMENT_STRATEGY setting
+STRATEGIES = {
+    'round_robin': RoundRobinStrategy,
+    'least_open': LeastOpenStrategy,
+    'location_affinity': LocationAffinityStrategy,
+}
+
+
+# Picks the support staff member a new issue is assigned to, using one of the STRATEGIES
+# The counters are seeded from the database through loader, a callable returning (name, location, open issues) rows,
+# and are seeded again every reseed_interval seconds so that changes made by other worker processes are picked up
+class AssignmentEngine(object):
+    def __init__(self, loader, strategy='least_open', reseed_interval=300):
+        if strategy not in STRATEGIES:
+            raise ValueError('Unknown assignment strategy: %s' % strategy)
+        self._loader = loader
+        self._strategy = STRATEGIES[strategy]()
+        self._reseed_interval = reseed_interval
+        self._tracker = None
+        self._seeded_at = None
+        self._lock = Lock()
+
+    # This method loads the counters from the database if they were never loaded or are due to be refreshed
+    def _ensure_seeded(self):
+        if self._seeded_at is not None and time.monotonic() - self._seeded_at < self._reseed_interval:
+            return
+        # Run the aggregate query outside the lock so other threads keep picking from the current counters
+        rows = self._loader()
+        tracker = LoadTracker()
+        for name, location, open_issues in rows:
+            tracker.add_agent(name)
+            if open_issues:
+                tracker.adjust(name, location, open_issues)
+        with self._lock:
+            self._tracker = tracker
+            self._seeded_at = time.monotonic()
+
+    # This method forces the counters to be seeded again on the next pick
+    def reset(self):
+        with self._lock:
+            self._seeded_at = None
+
+    # This method picks the support staff member for a new open issue at the given location
+    # The issue is counted straight away so that concurrent picks spread out; call release if it is not saved after all
+    def pick(self, location):
+        self._ensure_seeded()
+        with self._lock:
+            name = self._strategy.pick(self._tracker, location)
+            if name is not None:
+                self._tracker.adjust(name, location, 1)
+            return name
+
+    # This method undoes the counting done by pick for an issue that was never saved
+    def release(self, name, location):
+        with self._lock:
+            if self._tracker is not None and name is not None:
+                self._tracker.adjust(name, location, -1)
+
+    # This method updates the counters for an issue that went from the before state to the after state
+    # Each state is an object with support_name, location and status attributes, or None when the issue did not exist
+    def apply(self, before, after):
+        with self._lock:
+            if self._tracker is None:
+                # Nothing to update, the counters are seeded from the database on the next pick
+                return
+            if before is not None and before.support_name and is_open(before.status):
+                self._tracker.adjust(before.support_name, before.location, -1)
+            if after is not None and after.support_name and is_open(after.status):
+                self._tracker.adjust(after.support_name, after.location, 1)
+
+    # This method returns the number of open issues per support staff member, as currently tracked
+    def open_counts(self):
+        with self._lock:
+            return dict(self._tracker.counts) if self._tracker is not None else {}
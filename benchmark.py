@@ -0,0 +1,261 @@
+# Load test and benchmark harness for the ticketing application
+#
+# Drives logged-in employee and support staff sessions through /login, /my_issues, /issues, /issue/new and
+# /issue/<id>/update with a configurable number of concurrent users, then reports throughput and p50/p95/p99
+# latency per route and saves the results as JSON, which can be compared with the results of an earlier run.
+#
+# Generate the accounts to log in with first (flask seed-data), then either target a running server:
+#     python benchmark.py --base-url http://localhost:5000 --concurrency 16 --duration 60 --output run.json
+# or run the application in-process against the database in DATABASE_URL (SQLite or a local Postgres):
+#     DATABASE_URL=sqlite:///bench.db python benchmark.py --in-process --output run.json --compare previous.json
+
+# Import necessary libraries for the benchmark harness
+import argparse
+import http.cookiejar
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+# employee_email, support_email, SEED_PASSWORD from seed_data are the accounts generated by flask seed-data
+from seed_data import employee_email, support_email, SEED_PASSWORD
+
+# Hidden CSRF field rendered by form.hidden_tag()
+CSRF_PATTERN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+# Links to issue pages in the issue lists
+ISSUE_LINK_PATTERN = re.compile(r'/issues/(\d+)"')
+# Hidden version of the issue an update form was filled from, which the update must send back
+VERSION_PATTERN = re.compile(r'name="version" type="hidden" value="(\d+)"')
+# Statuses a benchmarked support session sets issues to
+STATUSES = ['Reported', 'In Progress', 'Resolved']
+# Categories a benchmarked employee session reports issues in
+CATEGORIES = ['Hardware', 'Software', 'Network', 'Printing', 'Other']
+
+
+# Raise urllib's HTTPError for redirects instead of following them, so every request is timed on its own
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+# Client talking to a running server over HTTP, with its own cookie jar
+class HttpClient(object):
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+
+    # This method sends a request and returns (status code, body text)
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(self.base_url + path, data=body, method=method)) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read().decode(errors='replace')
+
+
+# Client calling the application in-process through Flask's test client
+class InProcessClient(object):
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    # This method sends a request and returns (status code, body text)
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+
+# Collects the latency of every request per route, and the number of failed requests
+class Recorder(object):
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    # This method sends a request through the client, records how long it took and returns (status code, body text)
+    # A response with a status other than expected counts as an error for the route
+    def call(self, client, route, method, path, data=None, expected=(200,)):
+        started = time.perf_counter()
+        try:
+            status, body = client.request(method, path, data)
+        except Exception:
+            status, body = None, ''
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.samples.setdefault(route, []).append(elapsed)
+            if status not in expected:
+                self.errors[route] = self.errors.get(route, 0) + 1
+        return status, body
+
+
+# This function returns the CSRF token of the form in a page
+def csrf_token(body):
+    match = CSRF_PATTERN.search(body)
+    return match.group(1) if match else ''
+
+
+# This function returns the version of the issue an update form in a page was filled from
+def form_version(body):
+    match = VERSION_PATTERN.search(body)
+    return match.group(1) if match else ''
+
+
+# This function runs one virtual user until the deadline: it logs in, then keeps picking actions for its role
+def run_user(client, recorder, email, is_support, deadline, rng, think_time):
+    status, body = recorder.call(client, 'GET /login', 'GET', '/login')
+    status, body = recorder.call(client, 'POST /login', 'POST', '/login',
+                                 {'email': email, 'password': SEED_PASSWORD, 'csrf_token': csrf_token(body)}, expected=(302,))
+    if status != 302:
+        return
+    issue_ids = []
+    while time.perf_counter() < deadline:
+        action = rng.random()
+        if is_support:
+            if action < 0.5 or not issue_ids:
+                # Browse the support issue list, sometimes filtered
+                path = '/issues' if rng.random() < 0.5 else '/issues?status=%s' % rng.choice(STATUSES)
+                status, body = recorder.call(client, 'GET /issues', 'GET', path)
+                issue_ids = ISSUE_LINK_PATTERN.findall(body) or issue_ids
+            elif action < 0.7:
+                recorder.call(client, 'GET /issues/<id>', 'GET', '/issues/%s' % rng.choice(issue_ids))
+            else:
+                issue_id = rng.choice(issue_ids)
+                status, body = recorder.call(client, 'GET /issue/<id>/update', 'GET', '/issue/%s/update' % issue_id)
+                recorder.call(client, 'POST /issue/<id>/update', 'POST', '/issue/%s/update' % issue_id,
+                              {'status': rng.choice(STATUSES), 'version': form_version(body), 'csrf_token': csrf_token(body)},
+                              expected=(302, 409))
+        else:
+            if action < 0.5 or (action < 0.75 and not issue_ids):
+                # Check on their own issues
+                status, body = recorder.call(client, 'GET /my_issues', 'GET', '/my_issues')
+                issue_ids = ISSUE_LINK_PATTERN.findall(body) or issue_ids
+            elif action < 0.75:
+                recorder.call(client, 'GET /issues/<id>', 'GET', '/issues/%s' % rng.choice(issue_ids))
+            else:
+                # Report a new issue
+                status, body = recorder.call(client, 'GET /issue/new', 'GET', '/issue/new')
+                recorder.call(client, 'POST /issue/new', 'POST', '/issue/new',
+                              {'category': rng.choice(CATEGORIES), 'description': 'benchmark issue %d' % rng.randint(0, 10 ** 6),
+                               'csrf_token': csrf_token(body)}, expected=(302,))
+        if think_time:
+            time.sleep(think_time)
+
+
+# This function returns the p-th percentile of a sorted list of values, using the nearest-rank method
+def percentile(values, p):
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100.0 * len(values)) - 1)]
+
+
+# This function summarizes the recorded samples per route, and over all routes
+def summarize(recorder, elapsed):
+    routes = {}
+    everything = []
+    for route, samples in sorted(recorder.samples.items()):
+        samples = sorted(samples)
+        everything.extend(samples)
+        routes[route] = {
+            'requests': len(samples),
+            'errors': recorder.errors.get(route, 0),
+            'throughput_rps': round(len(samples) / elapsed, 2),
+            'mean_ms': round(sum(samples) / len(samples), 2),
+            'p50_ms': round(percentile(samples, 50), 2),
+            'p95_ms': round(percentile(samples, 95), 2),
+            'p99_ms': round(percentile(samples, 99), 2),
+        }
+    everything.sort()
+    total = {
+        'requests': len(everything),
+        'errors': sum(recorder.errors.values()),
+        'throughput_rps': round(len(everything) / elapsed, 2),
+        'p50_ms': round(percentile(everything, 50), 2),
+        'p95_ms': round(percentile(everything, 95), 2),
+        'p99_ms': round(percentile(everything, 99), 2),
+    }
+    return routes, total
+
+
+# This function prints the results per route, with the change against an earlier run if one is given
+def print_report(results, previous=None):
+    columns = ('requests', 'errors', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms')
+    print('%-28s %9s %7s %10s %9s %9s %9s' % (('route',) + columns))
+    rows = list(results['routes'].items()) + [('TOTAL', results['total'])]
+    for route, stats in rows:
+        print('%-28s %9d %7d %10.1f %9.1f %9.1f %9.1f' % ((route,) + tuple(stats[column] for column in columns)))
+        if previous is not None:
+            before = previous['total'] if route == 'TOTAL' else previous['routes'].get(route)
+            if before:
+                changes = []
+                for column in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+                    if before[column]:
+                        changes.append('%s %+.1f%%' % (column, (stats[column] - before[column]) * 100.0 / before[column]))
+                print('%-28s %s' % ('', ', '.join(changes)))
+
+
+# This function parses the command line, runs the benchmark and reports the results
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ticketing application with concurrent logged-in sessions.')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--base-url', help='URL of a running server, e.g. http://localhost:5000')
+    target.add_argument('--in-process', action='store_true', help='Run the application in-process against DATABASE_URL.')
+    parser.add_argument('--employees', type=int, default=1000, help='Number of generated employee accounts to log in as.')
+    parser.add_argument('--support', type=int, default=20, help='Number of generated support accounts to log in as.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of concurrent sessions.')
+    parser.add_argument('--support-share', type=float, default=0.25, help='Share of the sessions that are support staff.')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run for.')
+    parser.add_argument('--think-time', type=float, default=0, help='Seconds each session waits between actions.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the sessions.')
+    parser.add_argument('--output', help='Save the results to this JSON file.')
+    parser.add_argument('--compare', help='Compare the results with this earlier JSON results file.')
+    args = parser.parse_args()
+
+    if args.in_process:
+        # Imported here so that benchmarking a remote server does not need the application's dependencies
+        from app import app
+        app.config['TESTING'] = True
+        client_factory = lambda: InProcessClient(app)
+    else:
+        client_factory = lambda: HttpClient(args.base_url)
+
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = []
+    for number in range(args.concurrency):
+        is_support = number < round(args.concurrency * args.support_share)
+        email = support_email(rng.randrange(args.support)) if is_support else employee_email(rng.randrange(args.employees))
+        thread = threading.Thread(target=run_user, args=(client_factory(), recorder, email, is_support, deadline,
+                                                         random.Random(rng.random()), args.think_time))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    routes, total = summarize(recorder, elapsed)
+    results = {
+        'started_at': datetime.utcnow().isoformat() + 'Z',
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'duration_s': round(elapsed, 2),
+        'routes': routes,
+        'total': total,
+    }
+    previous = None
+    if args.compare:
+        with open(args.compare) as previous_file:
+            previous = json.load(previous_file)
+    print_report(results, previous)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Import necessary libraries for bulk export and import of issues
+# csv and json for the two supported file formats
+import csv
+import json
+# io.StringIO is used as the buffer each batch of CSV rows is written to
+import io
+# islice for splitting the imported rows into chunks
+from itertools import islice
+# ISSUE_CATEGORIES, ISSUE_STATUSES from forms are the values an imported issue is validated against
+from forms import ISSUE_CATEGORIES, ISSUE_STATUSES
+
+# File formats supported by the export and import, mapped to their mimetype
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+# Columns written by the export, in order
+EXPORT_FIELDS = ['issue_id', 'employee_id', 'employee_name', 'employee_email', 'location',
+                 'category', 'status', 'support_name', 'description']
+
+
+# This function turns an iterable of exported rows into chunks of CSV or NDJSON text
+# One chunk is produced per batch_size rows, so a streamed response sends a few large writes rather than one per row
+def export_chunks(rows, fmt, batch_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer is not None:
+        writer.writerow(EXPORT_FIELDS)
+    pending = 0
+    for row in rows:
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n')
+        pending += 1
+        # Hand out the batch and start a new buffer
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# This function reads the records of an import file, yielding (line number, record dict) pairs
+# text_stream is a text file object, fmt is one of FORMATS
+def read_records(text_stream, fmt):
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            # Records that are not JSON objects are passed on as None and reported by validate_record
+            yield line_number, record if isinstance(record, dict) else None
+
+
+# This function validates an imported record and returns (cleaned values, None), or (None, error message) if it is invalid
+# support_names is the set of names of the support staff, an assignee must be one of them
+def validate_record(record, support_names=()):
+    if record is None:
+        return None, 'not a JSON object'
+    # Read every field as stripped text, treating missing and empty fields alike
+    values = {field: str(record.get(field) or '').strip() for field in ('employee_id', 'category', 'description', 'status', 'support_name')}
+    try:
+        employee_id = int(values['employee_id'])
+    except ValueError:
+        return None, 'employee_id must be a number'
+    # The category must be one of the choices of IssueFormEmployee
+    if values['category'] not in ISSUE_CATEGORIES:
+        return None, 'category must be one of %s' % ', '.join(ISSUE_CATEGORIES)
+    if not values['description']:
+        return None, 'description is required'
+    # Issues without a status are imported as newly reported
+    status = values['status'] or ISSUE_STATUSES[0]
+    if status not in ISSUE_STATUSES:
+        return None, 'status must be one of %s' % ', '.join(ISSUE_STATUSES)
+    if values['support_name'] and values['support_name'] not in support_names:
+        return None, 'no support staff member named %s' % values['support_name']
+    return {
+        'employee_id': employee_id,
+        'category': values['category'],
+        'description': values['description'],
+        'status': status,
+        'support_name': values['support_name'] or None,
+    }, None
+
+
+# This function splits an iterable into lists of at most size items
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,40 @@
+# Import necessary libraries for conditional GET responses
+# hashlib and json for building ETags from the values a response is made of
+import hashlib
+import json
+# timezone for comparing naive UTC times from the database with the If-Modified-Since header
+from datetime import timezone
+# Response from flask for the empty 304 responses
+from flask import Response
+
+
+# This function returns a strong ETag for a response body that is fully determined by the given parts
+def make_etag(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# This function tells whether the client already holds the response with the given ETag and Last-Modified time
+# If-None-Match takes precedence over If-Modified-Since, as RFC 7232 requires; since Last-Modified only has
+# a precision of a second, clients should send the ETag back
+# If-None-Match uses the weak comparison, so the ETag still matches once compression has made it weak
+def is_not_modified(request, etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+    return False
+
+
+# This function adds the ETag and Last-Modified validators to a response
+# The responses depend on the logged-in user, so they may only be kept by the client and must be revalidated
+def add_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# This function returns the empty 304 Not Modified response for the given validators
+def not_modified_response(etag, last_modified):
+    return add_validators(Response(status=304), etag, last_modified)
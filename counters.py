@@ -0,0 +1,90 @@
+# Import necessary libraries for the dashboard's issue counters
+# select, func, delete from sqlalchemy for the aggregate and reconcile queries
+from sqlalchemy import select, func, delete
+# postgresql and sqlite insert constructs support INSERT ... ON CONFLICT DO UPDATE
+from sqlalchemy.dialects import postgresql, sqlite
+# is_open from assignment for telling open issues apart
+from assignment import is_open
+
+# Columns identifying a counter: one row of issue_counters per combination of their values
+COUNTER_DIMENSIONS = ('status', 'category', 'location', 'support_name')
+
+
+# This function returns the counter key of an issue state; unassigned issues are counted under an empty support_name
+def counter_key(state):
+    return (state.status, state.category, state.location, state.support_name or '')
+
+
+# This function adds the counter changes for an issue that went from the before state to the after state to deltas
+def add_counter_deltas(deltas, before, after):
+    if before is not None:
+        key = counter_key(before)
+        deltas[key] = deltas.get(key, 0) - 1
+    if after is not None:
+        key = counter_key(after)
+        deltas[key] = deltas.get(key, 0) + 1
+
+
+# This function applies counter deltas to the counters table with a single multi-row upsert
+# It runs in the caller's transaction, so the counters change together with the issues
+def apply_counter_deltas(session, table, deltas):
+    rows = [dict(zip(COUNTER_DIMENSIONS, key), count=delta) for key, delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    insert = postgresql.insert if session.connection().dialect.name == 'postgresql' else sqlite.insert
+    statement = insert(table).values(rows)
+    statement = statement.on_conflict_do_update(index_elements=list(COUNTER_DIMENSIONS),
+                                                set_={'count': table.c.count + statement.excluded.count})
+    session.execute(statement)
+
+
+# This function returns the query counting the issues of issues_table per counter key, the source of truth for the counters
+def group_by_query(issues_table):
+    support_name = func.coalesce(issues_table.c.support_name, '')
+    return select(issues_table.c.status, issues_table.c.category, issues_table.c.location, support_name, func.count())\
+        .group_by(issues_table.c.status, issues_table.c.category, issues_table.c.location, support_name)
+
+
+# This function returns the differences between a full GROUP BY of the issues and the stored counters, by counter key
+# Both are read on the given connection, which must see them in one snapshot for the differences to be drift
+def counter_drift(connection, counters_table, issues_table):
+    actual = {tuple(row[:4]): row[4] for row in connection.execute(group_by_query(issues_table))}
+    stored = {tuple(row[:4]): row[4] for row in connection.execute(select(*[counters_table.c[name] for name in COUNTER_DIMENSIONS], counters_table.c.count))}
+    return {key: actual.get(key, 0) - stored.get(key, 0) for key in set(actual) | set(stored)}
+
+
+# This function corrects any drift of the counters against a full GROUP BY of the issues, and returns the number of
+# counters that had to be corrected
+# Nothing is locked: on Postgres the issues and counters are read in one REPEATABLE READ snapshot on a connection of
+# its own, and the drift found in it is added to the counters, in the caller's transaction, as the same relative
+# upsert the issue changes use; changes committed after the snapshot adjust the counters themselves, so adding the
+# drift of the snapshot is right whichever order they commit in, and the issue writes never wait for the GROUP BY
+def reconcile_counters(session, counters_table, issues_table):
+    connection = session.connection()
+    if connection.dialect.name == 'postgresql':
+        with connection.engine.connect() as snapshot:
+            snapshot = snapshot.execution_options(isolation_level='REPEATABLE READ')
+            with snapshot.begin():
+                deltas = counter_drift(snapshot, counters_table, issues_table)
+    else:
+        # SQLite runs one writer at a time, so the caller's transaction sees the issues and counters as they are
+        deltas = counter_drift(session, counters_table, issues_table)
+    corrected = sum(1 for delta in deltas.values() if delta)
+    apply_counter_deltas(session, counters_table, deltas)
+    # Drop the counters that went down to zero, so the table only holds combinations that exist
+    session.execute(delete(counters_table).where(counters_table.c.count <= 0))
+    return corrected
+
+
+# This function sums counter rows into the dashboard figures: issues by status, and open issues by category,
+# location and assignee, plus open issues per category and location
+def summarize_counters(rows):
+    summary = {'by_status': {}, 'open_by_category': {}, 'open_by_location': {}, 'open_by_assignee': {}, 'open_by_category_location': {}}
+    for status, category, location, support_name, count in rows:
+        summary['by_status'][status] = summary['by_status'].get(status, 0) + count
+        if not is_open(status):
+            continue
+        for name, key in (('open_by_category', category), ('open_by_location', location),
+                          ('open_by_assignee', support_name), ('open_by_category_location', (category, location))):
+            summary[name][key] = summary[name].get(key, 0) + count
+    return summary
@@ -0,0 +1,207 @@
+# Import necessary libraries for pushing live issue events to the browsers over Server-Sent Events
+# json for encoding the events, logging for reporting a lost LISTEN connection
+import json
+import logging
+# queue for the bounded per-subscriber queues, select for waiting on the LISTEN connection
+import queue
+import select
+# threading for the LISTEN thread and the lock around the subscribers, time for the stream's deadline
+import threading
+import time
+# select and func from sqlalchemy for sending notifications with pg_notify
+from sqlalchemy import select as sql_select, func
+
+# Logger the LISTEN thread reports connection problems to
+events_log = logging.getLogger('ticketing.events')
+
+# Postgres channel the issue events are sent on
+EVENT_CHANNEL = 'issue_events'
+# Largest notification payload sent, safely below Postgres' limit of 8000 bytes
+NOTIFY_PAYLOAD_LIMIT = 7000
+
+
+# This function returns the events for an issue that went from the before state to the after state:
+# 'created' for a new issue, 'assigned' when its assignee changed and 'status' when its status changed
+def issue_events(before, after):
+    if after is None:
+        return []
+    event = {'issue_id': after.issue_id, 'employee_id': after.employee_id, 'status': after.status,
+             'category': after.category, 'location': after.location, 'support_name': after.support_name}
+    if before is None:
+        return [dict(event, type='created')]
+    events = []
+    if before.support_name != after.support_name:
+        events.append(dict(event, type='assigned'))
+    if before.status != after.status:
+        events.append(dict(event, type='status'))
+    return events
+
+
+# This function packs events into as few JSON array payloads as fit within the notification size limit
+def pack_payloads(events, limit=NOTIFY_PAYLOAD_LIMIT):
+    payloads, batch, size = [], [], 2
+    for event in events:
+        encoded = json.dumps(event, separators=(',', ':'))
+        if batch and size + len(encoded) + 1 > limit:
+            payloads.append('[%s]' % ','.join(batch))
+            batch, size = [], 2
+        batch.append(encoded)
+        size += len(encoded) + 1
+    if batch:
+        payloads.append('[%s]' % ','.join(batch))
+    return payloads
+
+
+# This function sends events to every worker process with pg_notify, in the session's transaction
+# Postgres only delivers the notifications once the transaction commits, and drops them if it rolls back
+def notify_events(session, events, channel=EVENT_CHANNEL):
+    for payload in pack_payloads(events):
+        session.execute(sql_select(func.pg_notify(channel, payload)))
+
+
+# A subscriber of the event broker, i.e. one open event stream
+# Events wait in a bounded queue; a subscriber that falls behind is told to resync instead of holding more events
+class Subscription(object):
+    def __init__(self, employee_id, maxsize):
+        # None receives every event (support staff), an employee id only the events of that employee's issues
+        self.employee_id = employee_id
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    # This method tells whether the subscriber receives the event
+    def wants(self, event):
+        return self.employee_id is None or event.get('employee_id') == self.employee_id
+
+    # This method queues the event, and returns False if the queue was full
+    def offer(self, event):
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.overflowed = True
+            return False
+
+    # This method returns the next event, or None if none arrived within timeout seconds
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+# In-process publish/subscribe of issue events between the request that made a change and the open event streams
+class EventBroker(object):
+    def __init__(self, queue_size=100, max_subscribers=1000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        # Counters reported by stats()
+        self.published = 0
+        self.dropped = 0
+
+    # This method adds a subscriber for an employee's events, or for every event when employee_id is None
+    # It returns None when the worker already serves max_subscribers streams
+    def subscribe(self, employee_id):
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscription = Subscription(employee_id, self.queue_size)
+            self._subscribers.add(subscription)
+            return subscription
+
+    # This method removes a subscriber
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    # This method hands the event to every subscriber that wants it, without ever blocking the publisher
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+        dropped = sum(1 for subscription in subscribers if subscription.wants(event) and not subscription.offer(event))
+        if dropped:
+            with self._lock:
+                self.dropped += dropped
+
+    # This method tells every subscriber to resync, used when events may have been missed
+    def resync_all(self):
+        with self._lock:
+            for subscription in self._subscribers:
+                subscription.overflowed = True
+
+    # This method returns the number of subscribers and the published and dropped event counters
+    def stats(self):
+        with self._lock:
+            return {'subscribers': len(self._subscribers), 'published': self.published, 'dropped': self.dropped}
+
+
+# This function yields the Server-Sent Events of a subscription until max_duration seconds have passed
+# A comment line is sent every heartbeat seconds without events, so proxies keep the connection open and closed
+# connections are noticed; the browser reconnects by itself when the stream ends
+def event_stream(broker, subscription, heartbeat, max_duration, clock=time.monotonic):
+    try:
+        yield 'retry: 5000\n\n'
+        deadline = clock() + max_duration
+        while clock() < deadline:
+            # Events were dropped for this subscriber, so it has to reload what it shows
+            if subscription.overflowed:
+                yield 'event: resync\ndata: {}\n\n'
+                return
+            event = subscription.get(min(heartbeat, max(deadline - clock(), 0)))
+            if event is None:
+                yield ': keepalive\n\n'
+            else:
+                yield 'event: %s\ndata: %s\n\n' % (event['type'], json.dumps(event))
+    finally:
+        broker.unsubscribe(subscription)
+
+
+# Relays the issue events that every worker process sends with pg_notify to the local event broker
+# It runs in a daemon thread on its own database connection, started with the first event stream of the worker
+class PostgresRelay(object):
+    def __init__(self, broker, channel=EVENT_CHANNEL, poll_seconds=5.0):
+        self.broker = broker
+        self.channel = channel
+        self.poll_seconds = poll_seconds
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # This method starts the relay thread for the engine, unless it is running already
+    def start(self, engine):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(engine,), name='issue-events-relay', daemon=True)
+                self._thread.start()
+
+    def _run(self, engine):
+        while True:
+            try:
+                self._listen(engine)
+            except Exception:
+                events_log.exception('Lost the LISTEN connection for issue events, reconnecting')
+            # Events sent while the connection was down are lost, so every stream has to resync
+            self.broker.resync_all()
+            time.sleep(1)
+
+    def _listen(self, engine):
+        connection = engine.raw_connection()
+        # The connection is kept for as long as the worker lives, so it is taken out of the pool
+        connection.detach()
+        try:
+            dbapi_connection = connection.connection
+            dbapi_connection.autocommit = True
+            cursor = dbapi_connection.cursor()
+            cursor.execute('LISTEN %s' % self.channel)
+            while True:
+                # Wait until a notification arrives, checking the connection every poll_seconds
+                if select.select([dbapi_connection], [], [], self.poll_seconds) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notification = dbapi_connection.notifies.pop(0)
+                    for event in json.loads(notification.payload):
+                        self.broker.publish(event)
+        finally:
+            connection.close()
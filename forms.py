@@ -1,24 +1,54 @@
 # Import necessary libraries for form creation
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import IntegerField, StringField, SubmitField, PasswordField, BooleanField, SelectField
+from wtforms.widgets import HiddenInput
 from wtforms.validators import DataRequired, Length, Email, EqualTo, Optional
 
+# Issue categories an employee can pick from, also used to filter the issue lists
+ISSUE_CATEGORIES = ['Hardware', 'Software', 'Network', 'Printing', 'Other']
+# Issue statuses support staff can set, also used to filter the issue lists
+ISSUE_STATUSES = ['Reported', 'In Progress', 'Resolved']
+
 # Form for issue creation for an employee
 class IssueFormEmployee(FlaskForm): 
     # Drop-down menu for issue category selection
-    category = SelectField('Category', choices=[('Hardware', 'Hardware'), ('Software', 'Software'), ('Network', 'Network'), ('Printing', 'Printing'), ('Other', 'Other')], validators=[DataRequired()])
+    category = SelectField('Category', choices=[(category, category) for category in ISSUE_CATEGORIES], validators=[DataRequired()])
     # Text field for issue description
     description = StringField('Description', validators=[DataRequired()])
+    # Hidden version of the issue the update form was filled from, empty when reporting a new issue
+    version = IntegerField(widget=HiddenInput(), validators=[Optional()])
     # Submit button for the form
     submit = SubmitField('Submit')
 
 # Form for issue handling for support staff
 class IssueFormSupport(FlaskForm): 
     # Drop-down menu for issue status update
-    status = SelectField('Status', choices=[('Reported', 'Reported'), ('In Progress', 'In Progress'), ('Resolved', 'Resolved')], default='In Progress')
+    status = SelectField('Status', choices=[(status, status) for status in ISSUE_STATUSES], default='In Progress')
+    # Hidden version of the issue the form was filled from
+    version = IntegerField(widget=HiddenInput(), validators=[Optional()])
     # Submit button for the form
     submit = SubmitField('Submit')
 
+# Form for bulk importing issues from a file, for support staff
+class IssueImportForm(FlaskForm):
+    # File upload for the CSV or NDJSON file of issues
+    file = FileField('Issues File', validators=[FileRequired(), FileAllowed(['csv', 'ndjson'], 'Please upload a .csv or .ndjson file.')])
+    # Submit button for the form
+    submit = SubmitField('Import')
+
+# Form for bulk triage on the support issue list: set the status and/or assignee of many issues at once
+# The selected issues are posted as issue_ids checkboxes of the list's rows
+class BulkTriageForm(FlaskForm):
+    # Whether the action applies to the selected issues or to every issue matching the list's filters
+    scope = SelectField('Apply To', choices=[('selected', 'Selected issues'), ('matching', 'All issues matching the filters')], default='selected')
+    # New status, left empty to keep the status of each issue
+    status = SelectField('Status', choices=[('', 'Keep status')] + [(status, status) for status in ISSUE_STATUSES], default='')
+    # New assignee, left empty to keep the assignee of each issue; the view fills in the support staff members
+    support_name = SelectField('Assign To', choices=[('', 'Keep assignee')], default='')
+    # Submit button for the form
+    submit = SubmitField('Apply')
+
 # Form for new user registration
 class RegistrationForm(FlaskForm): 
     # Fields for various user data
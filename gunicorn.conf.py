@@ -0,0 +1,48 @@
+# gunicorn configuration for serving the application in production: gunicorn -c gunicorn.conf.py wsgi:app
+# Every setting can be overridden from the environment
+import multiprocessing
+import os
+import tempfile
+
+# Address and port to listen on
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+# Number of worker processes, by default two per core plus one
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Number of threads per worker process; more than one switches to the threaded worker
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = os.environ.get('WEB_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+# Load the application and its templates once in the master process, before the workers are forked
+preload_app = os.environ.get('WEB_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+# Seconds a worker may spend on a request before it is killed and restarted
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+# Seconds in-flight requests get to finish after a worker is asked to shut down
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+# Seconds to hold idle keep-alive connections open
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 5))
+# Restart a worker after this many requests, with some jitter, to cap the impact of memory growth
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 100))
+# Log requests and errors to the container's output
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-')
+errorlog = '-'
+# Directory the workers share their metrics through, so /metrics reports all of them whichever worker is scraped
+# It is set in the environment before the application is loaded, and emptied when the server starts
+metrics_dir = os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'ticketing-metrics'))
+
+
+# Start the metrics of a new server from zero
+def on_starting(server):
+    from metrics import reset_store
+    reset_store(metrics_dir)
+
+
+# Give every worker its own database connection pool after it is forked
+def post_fork(server, worker):
+    from wsgi import init_worker
+    init_worker()
+
+
+# Close the worker's database connections once it has finished its in-flight requests
+def worker_exit(server, worker):
+    from wsgi import close_worker
+    close_worker()
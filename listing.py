@@ -0,0 +1,133 @@
+# Import necessary libraries for building paginated issue list queries
+# base64 and json are used to encode the pagination cursor handed to the browser
+import base64
+import json
+# tuple_, bindparam from sqlalchemy for building the keyset comparison and the open issues filter
+from sqlalchemy import tuple_, bindparam
+# CLOSED_STATUSES from assignment for telling open issues apart
+from assignment import CLOSED_STATUSES
+# namedtuple for the parsed query string parameters
+from collections import namedtuple
+
+# Number of issues shown per page unless the query string asks for another amount
+DEFAULT_PAGE_SIZE = 25
+# Upper bound on the page size a client can ask for
+MAX_PAGE_SIZE = 100
+# Columns the issue lists can be filtered on through the query string
+FILTER_FIELDS = ('status', 'category', 'location', 'support_name')
+# Sort orders offered on the issue lists, mapped to (column name, descending)
+# Only non-nullable columns are offered so that the keyset comparison stays index friendly
+SORT_OPTIONS = {
+    'newest': ('issue_id', True),
+    'oldest': ('issue_id', False),
+    'status': ('status', False),
+    'category': ('category', False),
+    'location': ('location', False),
+}
+# Sort order used when the query string does not ask for one
+DEFAULT_SORT = 'newest'
+# Value of the status filter that selects every issue which is not closed yet
+OPEN_STATUS_FILTER = 'Open'
+
+# Parameters of a list request after they have been read from the query string
+ListParams = namedtuple('ListParams', ['filters', 'sort', 'per_page', 'cursor'])
+
+
+# This function returns the condition selecting the open issues of the model
+# The closed statuses are rendered inline rather than bound, so the planner can match the partial indexes on open issues
+def open_issues_clause(model):
+    return model.status.notin_(bindparam('closed_statuses', list(CLOSED_STATUSES), expanding=True, literal_execute=True))
+
+
+# This function returns the condition selecting the closed issues of the model, rendered inline like open_issues_clause
+def closed_issues_clause(model):
+    return model.status.in_(bindparam('closed_statuses', list(CLOSED_STATUSES), expanding=True, literal_execute=True))
+
+
+# This function encodes the sort key of the last row of a page into an opaque, URL safe token
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+# This function tells whether a value decoded from a cursor has the given type; JSON's true and false decode to
+# bool, which Python counts as an int
+def is_cursor_value(value, value_type):
+    return isinstance(value, value_type) and not isinstance(value, bool)
+
+
+# This function decodes a cursor token back into the sort key it was built from for the given sort order
+# A tampered or malformed token is treated as no cursor at all, so the user simply lands on the first page
+def decode_cursor(token, sort=DEFAULT_SORT):
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        return None
+    # A cursor is always a [sort value, issue_id] pair, whose sort value has the type of the sort column:
+    # an int for issue_id, a string for the other sort columns
+    if not isinstance(values, list) or len(values) != 2 or not is_cursor_value(values[1], int):
+        return None
+    if not is_cursor_value(values[0], int if SORT_OPTIONS[sort][0] == 'issue_id' else str):
+        return None
+    return values
+
+
+# This function reads the filters, sort order, page size and cursor from the request's query string
+def parse_list_args(args):
+    # Keep only the filters that were actually filled in
+    filters = {field: args.get(field).strip() for field in FILTER_FIELDS if args.get(field, '').strip()}
+    # Fall back to the default sort order for unknown values
+    sort = args.get('sort') if args.get('sort') in SORT_OPTIONS else DEFAULT_SORT
+    # Clamp the page size between 1 and MAX_PAGE_SIZE
+    per_page = args.get('per_page', DEFAULT_PAGE_SIZE, type=int) or DEFAULT_PAGE_SIZE
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    return ListParams(filters, sort, per_page, decode_cursor(args.get('cursor'), sort))
+
+
+# This function pushes the filters of a list request down into the WHERE clause of a query
+def apply_filters(query, model, filters):
+    for field, value in filters.items():
+        if field == 'status' and value == OPEN_STATUS_FILTER:
+            query = query.filter(open_issues_clause(model))
+        else:
+            query = query.filter(getattr(model, field) == value)
+    return query
+
+
+# This function applies the filters, keyset condition, ordering and limit of a list request to a query
+# One extra row is fetched so that split_page can tell whether there is a next page without a COUNT query
+def build_page_query(query, model, params):
+    query = apply_filters(query, model, params.filters)
+    column_name, descending = SORT_OPTIONS[params.sort]
+    sort_column = getattr(model, column_name)
+    id_column = model.issue_id
+    # Keyset condition: continue strictly after the last row of the previous page
+    if params.cursor is not None:
+        last_value, last_id = params.cursor
+        if column_name == 'issue_id':
+            query = query.filter(id_column < last_id if descending else id_column > last_id)
+        else:
+            # A row value comparison on (sort column, issue_id) is a single range of the (column, issue_id) indexes
+            key, last_key = tuple_(sort_column, id_column), tuple_(last_value, last_id)
+            query = query.filter(key < last_key if descending else key > last_key)
+    # Order by the sort column, using issue_id as the tie breaker so the order is total
+    # The tie breaker goes in the same direction as the sort column, so the (column, issue_id) indexes give the order
+    # and the database does not have to sort the rows
+    if column_name == 'issue_id':
+        query = query.order_by(id_column.desc() if descending else id_column.asc())
+    elif descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    return query.limit(params.per_page + 1)
+
+
+# This function trims the extra row fetched by build_page_query and builds the cursor for the next page
+def split_page(rows, params):
+    if len(rows) <= params.per_page:
+        return rows, None
+    rows = rows[:params.per_page]
+    column_name = SORT_OPTIONS[params.sort][0]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, column_name), last.issue_id])
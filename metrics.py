@@ -0,0 +1,431 @@
+# Import necessary libraries for per-request instrumentation
+# bisect for finding the histogram bucket of an observation
+import bisect
+# json and os for the files the worker processes share their metrics through
+import json
+import os
+# logging for the slow request and slow query logs
+import logging
+# time.perf_counter for timing requests, queries and template renders
+import time
+# Lock makes the metrics safe to update from the threads of a worker process
+from threading import Lock
+# contextmanager for the lock around the shared metrics files
+from contextlib import contextmanager
+# Response, g, request, abort and the template signals from flask for hooking into the request lifecycle
+from flask import Response, g, request, abort, has_app_context
+from flask.signals import before_render_template, template_rendered, signals_available
+# event, Engine from sqlalchemy for hooking into every statement sent to the database
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# fcntl locks the shared metrics files; it is only missing on Windows, where gunicorn does not run
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Logger the slow requests and slow queries are written to
+slow_log = logging.getLogger('ticketing.slow')
+
+# Histogram buckets for durations in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Histogram buckets for the number of queries of a request
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+
+# This function formats a set of labels the way the Prometheus text format expects them
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in labels)
+
+
+# Counter metric, one value per combination of label values
+class Counter(object):
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = Lock()
+
+    # This method adds amount to the counter for the given label values
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    # This method drops every value of the counter
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    # This method returns the values of the counter as a list of [label values, value] pairs, which JSON can hold
+    def snapshot(self):
+        with self._lock:
+            return [[list(label_values), value] for label_values, value in self._values.items()]
+
+    # This method adds the values of a snapshot to the totals, a dict mapping label values to values
+    @staticmethod
+    def merge(totals, snapshot):
+        for label_values, value in snapshot:
+            label_values = tuple(label_values)
+            totals[label_values] = totals.get(label_values, 0) + value
+
+    # This method returns the lines of the metric in the Prometheus text format, for its own values or the given ones
+    def render(self, values=None):
+        lines = ['# HELP %s %s' % (self.name, self.help_text), '# TYPE %s counter' % self.name]
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append('%s%s %s' % (self.name, format_labels(zip(self.label_names, label_values)), value))
+        return lines
+
+
+# Gauge metric whose values are read from a callable when the metrics are rendered
+# The callable returns a dict mapping tuples of label values to values
+class CallbackGauge(object):
+    def __init__(self, name, help_text, label_names, callback):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._callback = callback
+
+    # This method returns the current values of the gauge as a list of [label values, value] pairs, which JSON can hold
+    def snapshot(self):
+        return [[list(label_values), value] for label_values, value in self._callback().items()]
+
+    # This method returns the lines of the metric in the Prometheus text format, for its current values or the given
+    # ones, whose label values start with those of the extra label names
+    def render(self, values=None, extra_label_names=()):
+        lines = ['# HELP %s %s' % (self.name, self.help_text), '# TYPE %s gauge' % self.name]
+        if values is None:
+            values = self._callback()
+        label_names = tuple(extra_label_names) + tuple(self.label_names)
+        for label_values, value in sorted(values.items()):
+            lines.append('%s%s %s' % (self.name, format_labels(zip(label_names, label_values)), value))
+        return lines
+
+
+# Histogram metric, one set of buckets per combination of label values
+class Histogram(object):
+    def __init__(self, name, help_text, label_names=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # Maps label values to [bucket counts..., sum, count]
+        self._values = {}
+        self._lock = Lock()
+
+    # This method records an observation for the given label values
+    def observe(self, value, *label_values):
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            # Only the first bucket the value fits in is counted here, render makes the counts cumulative
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    # This method drops every state of the histogram
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    # This method returns the states of the histogram as a list of [label values, state] pairs, which JSON can hold
+    def snapshot(self):
+        with self._lock:
+            return [[list(label_values), list(state)] for label_values, state in self._values.items()]
+
+    # This method adds the states of a snapshot to the totals, a dict mapping label values to states
+    @staticmethod
+    def merge(totals, snapshot):
+        for label_values, state in snapshot:
+            label_values = tuple(label_values)
+            total = totals.get(label_values)
+            totals[label_values] = list(state) if total is None else [a + b for a, b in zip(total, state)]
+
+    # This method returns the lines of the metric in the Prometheus text format, for its own states or the given ones
+    def render(self, values=None):
+        lines = ['# HELP %s %s' % (self.name, self.help_text), '# TYPE %s histogram' % self.name]
+        if values is None:
+            with self._lock:
+                values = {label_values: list(state) for label_values, state in self._values.items()}
+        for label_values, state in sorted(values.items()):
+            labels = list(zip(self.label_names, label_values))
+            cumulative = 0
+            for bucket, count in zip(self.buckets, state):
+                cumulative += count
+                lines.append('%s_bucket%s %d' % (self.name, format_labels(labels + [('le', bucket)]), cumulative))
+            lines.append('%s_bucket%s %d' % (self.name, format_labels(labels + [('le', '+Inf')]), state[-1]))
+            lines.append('%s_sum%s %s' % (self.name, format_labels(labels), state[-2]))
+            lines.append('%s_count%s %d' % (self.name, format_labels(labels), state[-1]))
+        return lines
+
+
+# This function tells whether a process with the given pid is still running
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # The process exists but belongs to another user
+        return True
+    return True
+
+
+# Directory the worker processes of one server write their metrics to, so /metrics can report the totals of all
+# of them whichever worker serves the scrape
+# Every worker writes its own file, replaced as a whole; a worker that exits adds its counters and histograms to
+# a shared file of retired workers, so the totals never go down when workers are restarted
+class MultiProcessStore(object):
+    RETIRED = 'retired.json'
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    # Readers share the lock, a retiring worker holds it alone, so a scrape never counts a worker twice or not at all
+    @contextmanager
+    def _locked(self, exclusive):
+        with open(self._path('.lock'), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # This method writes a file at once, so a reader sees either the old or the new content
+    def _write(self, name, data):
+        path = self._path(name)
+        with open('%s.%d.tmp' % (path, os.getpid()), 'w') as output:
+            json.dump(data, output)
+        os.replace('%s.%d.tmp' % (path, os.getpid()), path)
+
+    def _read(self, name):
+        try:
+            with open(self._path(name)) as source:
+                return json.load(source)
+        except (OSError, ValueError):
+            return None
+
+    # This method writes the metrics of the current worker process
+    def write(self, data):
+        self._write('worker_%d.json' % os.getpid(), dict(data, pid=os.getpid()))
+
+    # This method adds the counters and histograms of the current worker process to those of the retired workers,
+    # and removes its file; its gauges describe the process itself, so they go with it
+    def retire(self, data, merge):
+        with self._locked(exclusive=True):
+            retired = self._read(self.RETIRED) or {'metrics': {}}
+            retired['metrics'] = merge([retired['metrics'], data['metrics']])
+            self._write(self.RETIRED, retired)
+            try:
+                os.remove(self._path('worker_%d.json' % os.getpid()))
+            except OSError:
+                pass
+
+    # This method returns the metrics files of the retired workers and of every worker process
+    def read_all(self):
+        with self._locked(exclusive=False):
+            names = sorted(name for name in os.listdir(self.directory) if name == self.RETIRED
+                           or (name.startswith('worker_') and name.endswith('.json')))
+            return [data for data in (self._read(name) for name in names) if data is not None]
+
+
+# This function empties the metrics directory of a server that is starting, so it does not count an earlier run's requests
+def reset_store(directory):
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+# Per-request instrumentation of a Flask application and its SQLAlchemy engines, exposed on /metrics
+# Records per-route latency, database time, template render time and query count histograms, logs slow requests
+# and slow queries with their SQL, and can add X-Query-Count / X-DB-Time-Ms headers to every response
+# The metrics are kept per worker process; with METRICS_MULTIPROC_DIR set, every worker also writes them to that
+# directory every METRICS_FLUSH_SECONDS, and /metrics reports the counters and histograms summed over all the
+# workers and the gauges of every live worker with a worker label
+class RequestMetrics(object):
+    def __init__(self, app=None):
+        self.metrics = []
+        self.store = None
+        self._last_flush = 0.0
+        self.requests = self.add(Counter('http_requests_total', 'Requests handled, by route and status code.', ('route', 'status')))
+        self.latency = self.add(Histogram('http_request_duration_seconds', 'Total time spent handling a request.', ('route',)))
+        self.db_time = self.add(Histogram('db_time_per_request_seconds', 'Time spent in database queries per request.', ('route',)))
+        self.render_time = self.add(Histogram('template_render_seconds', 'Time spent rendering templates per request.', ('route',)))
+        self.query_count = self.add(Histogram('db_queries_per_request', 'Number of database queries per request.', ('route',), QUERY_COUNT_BUCKETS))
+        if app is not None:
+            self.init_app(app)
+
+    # This method registers a metric to be exposed on /metrics and returns it
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    # This method hooks the instrumentation into the application
+    def init_app(self, app):
+        app.config.setdefault('SLOW_REQUEST_MS', 500)
+        app.config.setdefault('SLOW_QUERY_MS', 100)
+        app.config.setdefault('METRICS_DEBUG_HEADERS', False)
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.config.setdefault('METRICS_MULTIPROC_DIR', None)
+        app.config.setdefault('METRICS_FLUSH_SECONDS', 5)
+        self.app = app
+        if app.config['METRICS_MULTIPROC_DIR']:
+            self.store = MultiProcessStore(app.config['METRICS_MULTIPROC_DIR'])
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        # Template render times are only recorded when Flask's signals are available (blinker is installed)
+        if signals_available:
+            before_render_template.connect(self._start_render, app)
+            template_rendered.connect(self._finish_render, app)
+        # Listening on the Engine class covers every engine the application creates
+        event.listen(Engine, 'before_cursor_execute', self._start_query)
+        event.listen(Engine, 'after_cursor_execute', self._finish_query)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+
+    # This method returns the metrics collected for the current request, or None outside of a request
+    @staticmethod
+    def _current():
+        if has_app_context():
+            return g.get('request_metrics')
+        return None
+
+    def _start_request(self):
+        g.request_metrics = {'start': time.perf_counter(), 'queries': 0, 'db_time': 0.0, 'render_time': 0.0, 'slow_queries': []}
+
+    def _start_render(self, sender, template, context, **extra):
+        stats = self._current()
+        if stats is not None:
+            stats['render_start'] = time.perf_counter()
+
+    def _finish_render(self, sender, template, context, **extra):
+        stats = self._current()
+        if stats is not None and 'render_start' in stats:
+            stats['render_time'] += time.perf_counter() - stats.pop('render_start')
+
+    def _start_query(self, connection, cursor, statement, parameters, context, executemany):
+        stats = self._current()
+        if stats is not None:
+            stats['query_start'] = time.perf_counter()
+
+    def _finish_query(self, connection, cursor, statement, parameters, context, executemany):
+        stats = self._current()
+        if stats is None or 'query_start' not in stats:
+            return
+        elapsed = time.perf_counter() - stats.pop('query_start')
+        stats['queries'] += 1
+        stats['db_time'] += elapsed
+        if elapsed * 1000 >= self.app.config['SLOW_QUERY_MS']:
+            stats['slow_queries'].append((elapsed, statement))
+            slow_log.warning('Slow query (%.1f ms) in %s %s: %s', elapsed * 1000, request.method, request.path, statement)
+
+    def _finish_request(self, response):
+        stats = self._current()
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats['start']
+        # Label by endpoint rather than path, so the number of label values stays bounded
+        route = request.endpoint or 'unmatched'
+        self.requests.inc(route, response.status_code)
+        self.latency.observe(elapsed, route)
+        self.db_time.observe(stats['db_time'], route)
+        self.render_time.observe(stats['render_time'], route)
+        self.query_count.observe(stats['queries'], route)
+        if elapsed * 1000 >= self.app.config['SLOW_REQUEST_MS']:
+            slowest = max(stats['slow_queries'], default=None)
+            slow_log.warning('Slow request (%.1f ms) %s %s: %d queries, %.1f ms in the database, %.1f ms rendering%s',
+                             elapsed * 1000, request.method, request.path, stats['queries'], stats['db_time'] * 1000,
+                             stats['render_time'] * 1000, '; slowest query: %s' % slowest[1] if slowest else '')
+        if self.app.config['METRICS_DEBUG_HEADERS']:
+            response.headers['X-Query-Count'] = str(stats['queries'])
+            response.headers['X-DB-Time-Ms'] = '%.1f' % (stats['db_time'] * 1000)
+        if self.store is not None and time.monotonic() - self._last_flush >= self.app.config['METRICS_FLUSH_SECONDS']:
+            self.flush()
+        return response
+
+    # This method returns the snapshot of every metric of the worker process, split into the counters and
+    # histograms, which add up across workers, and the gauges, which do not
+    def _snapshot(self):
+        data = {'metrics': {}, 'gauges': {}}
+        for metric in self.metrics:
+            data['gauges' if isinstance(metric, CallbackGauge) else 'metrics'][metric.name] = metric.snapshot()
+        return data
+
+    # This method adds up the counter and histogram snapshots of several workers, by metric name
+    def _merge(self, snapshots):
+        kinds = {metric.name: metric for metric in self.metrics if not isinstance(metric, CallbackGauge)}
+        totals = {}
+        for snapshot in snapshots:
+            for name, values in snapshot.items():
+                if name in kinds:
+                    kinds[name].merge(totals.setdefault(name, {}), values)
+        return {name: [[list(label_values), value] for label_values, value in values.items()] for name, values in totals.items()}
+
+    # This method writes the metrics of the worker process to the shared directory
+    def flush(self):
+        self._last_flush = time.monotonic()
+        self.store.write(self._snapshot())
+
+    # This method starts the counters and histograms of a newly forked worker process from zero, since the ones it
+    # inherited are still counted by the process it was forked from
+    def reset(self):
+        for metric in self.metrics:
+            if not isinstance(metric, CallbackGauge):
+                metric.reset()
+        self._last_flush = 0.0
+
+    # This method hands the counters and histograms of an exiting worker process over to the retired workers' totals
+    def retire(self):
+        if self.store is not None:
+            self.store.retire(self._snapshot(), self._merge)
+
+    # This method renders every registered metric in the Prometheus text format
+    def render(self):
+        lines = []
+        if self.store is None:
+            for metric in self.metrics:
+                lines.extend(metric.render())
+            return '\n'.join(lines) + '\n'
+        # The worker serving the scrape writes its latest values first
+        self.flush()
+        files = self.store.read_all()
+        totals = self._merge([data['metrics'] for data in files])
+        gauges = {}
+        for data in files:
+            if 'pid' not in data or not process_alive(data['pid']):
+                continue
+            for name, values in data.get('gauges', {}).items():
+                for label_values, value in values:
+                    gauges.setdefault(name, {})[(str(data['pid']),) + tuple(label_values)] = value
+        for metric in self.metrics:
+            if isinstance(metric, CallbackGauge):
+                lines.extend(metric.render(gauges.get(metric.name, {}), extra_label_names=('worker',)))
+            else:
+                values = {}
+                metric.merge(values, totals.get(metric.name, []))
+                lines.extend(metric.render(values))
+        return '\n'.join(lines) + '\n'
+
+    def _metrics_view(self):
+        # When METRICS_TOKEN is set, scrapers must send it as a bearer token
+        token = self.app.config['METRICS_TOKEN']
+        if token and request.headers.get('Authorization') != 'Bearer %s' % token:
+            abort(403)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,191 @@
+# Import necessary libraries for versioned schema migrations
+# datetime for recording when a migration was applied
+from datetime import datetime
+# Table definition helpers and text from sqlalchemy for the version table and raw DDL
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, text
+
+# Table recording which migrations have been applied to the database
+version_metadata = MetaData()
+schema_version = Table(
+    'schema_version', version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+# Registered migrations as (version, description, function) tuples, in version order
+# Every function receives the connection of the migration's transaction and the models' metadata
+# Migrations must be safe to run against a schema that create_all has already brought up to date
+MIGRATIONS = []
+
+
+# This decorator registers a function as the migration with the given version
+def migration(version, description):
+    def register(function):
+        MIGRATIONS.append((version, description, function))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return function
+    return register
+
+
+# This function returns the version the database has been migrated to, 0 for a database never migrated
+def current_version(connection):
+    schema_version.create(connection, checkfirst=True)
+    return connection.execute(text('SELECT MAX(version) FROM schema_version')).scalar() or 0
+
+
+# This function applies every migration newer than the database's version, each in its own transaction
+# It returns the list of (version, description) pairs that were applied
+def upgrade(engine, metadata, target=None):
+    applied = []
+    for version, description, function in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with engine.begin() as connection:
+            # On Postgres, serialize concurrent upgrades so two processes never apply the same migration
+            if connection.dialect.name == 'postgresql':
+                connection.execute(text('SELECT pg_advisory_xact_lock(4242)'))
+            if version <= current_version(connection):
+                continue
+            function(connection, metadata)
+            connection.execute(schema_version.insert().values(version=version, description=description, applied_at=datetime.utcnow()))
+        applied.append((version, description))
+    return applied
+
+
+# Create the tables of the models that do not exist yet
+@migration(1, 'Create the ticketing tables')
+def create_tables(connection, metadata):
+    metadata.create_all(connection)
+
+
+# Make sure every issue points at the employee who reported it, and index issues by employee
+@migration(2, 'Backfill and index issues.employee_id')
+def index_issue_employee_id(connection, metadata):
+    # Backfill employee_id from the denormalized reporter email for rows where the two disagree
+    connection.execute(text(
+        'UPDATE issues SET employee_id = '
+        '(SELECT employees.employee_id FROM employees WHERE employees.email = issues.employee_email) '
+        'WHERE EXISTS (SELECT 1 FROM employees WHERE employees.email = issues.employee_email '
+        'AND employees.employee_id <> issues.employee_id)'
+    ))
+    # The issue_id column makes the index cover the keyset pagination of an employee's issue list
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_issues_employee_id ON issues (employee_id, issue_id)'))
+
+
+# Index the columns the issue lists are filtered and sorted on, and the open issues
+@migration(3, 'Index issues for the list filters and open issues')
+def index_issue_filters(connection, metadata):
+    for statement in (
+        # Status and category filters of the support issue list, newest first
+        'CREATE INDEX IF NOT EXISTS ix_issues_status ON issues (status, issue_id)',
+        'CREATE INDEX IF NOT EXISTS ix_issues_status_category ON issues (status, category, issue_id)',
+        'CREATE INDEX IF NOT EXISTS ix_issues_category ON issues (category, issue_id)',
+        # Location and assignee filters of the support issue list
+        'CREATE INDEX IF NOT EXISTS ix_issues_location ON issues (location, issue_id)',
+        'CREATE INDEX IF NOT EXISTS ix_issues_support_name ON issues (support_name, issue_id)',
+        # Open issues only: the "Open" list filter and the assignment engine's workload query
+        "CREATE INDEX IF NOT EXISTS ix_issues_open ON issues (issue_id) WHERE status NOT IN ('Resolved')",
+        "CREATE INDEX IF NOT EXISTS ix_issues_open_support ON issues (support_name, location) WHERE status NOT IN ('Resolved')",
+    ):
+        connection.execute(text(statement))
+
+
+# This function adds a full-text search index over the description column of the issues table or of a table like it
+# The index is named after the table, as search.search_backend expects
+def create_search_index(connection, table_name):
+    names = {'table': table_name}
+    if connection.dialect.name == 'postgresql':
+        # A generated column is kept current by Postgres itself on every insert and update
+        connection.execute(text(
+            'ALTER TABLE %(table)s ADD COLUMN IF NOT EXISTS search_vector tsvector '
+            "GENERATED ALWAYS AS (to_tsvector('english', coalesce(description, ''))) STORED" % names
+        ))
+        connection.execute(text('CREATE INDEX IF NOT EXISTS ix_%(table)s_search ON %(table)s USING GIN (search_vector)' % names))
+        return
+    # SQLite: an external content FTS5 table over the description column, kept in step by triggers
+    connection.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS %(table)s_fts USING fts5(description, content='%(table)s', content_rowid='issue_id')" % names
+    ))
+    connection.execute(text(
+        'CREATE TRIGGER IF NOT EXISTS %(table)s_fts_insert AFTER INSERT ON %(table)s BEGIN '
+        'INSERT INTO %(table)s_fts (rowid, description) VALUES (new.issue_id, new.description); END' % names
+    ))
+    connection.execute(text(
+        'CREATE TRIGGER IF NOT EXISTS %(table)s_fts_delete AFTER DELETE ON %(table)s BEGIN '
+        "INSERT INTO %(table)s_fts (%(table)s_fts, rowid, description) VALUES ('delete', old.issue_id, old.description); END" % names
+    ))
+    connection.execute(text(
+        'CREATE TRIGGER IF NOT EXISTS %(table)s_fts_update AFTER UPDATE OF description ON %(table)s BEGIN '
+        "INSERT INTO %(table)s_fts (%(table)s_fts, rowid, description) VALUES ('delete', old.issue_id, old.description); "
+        'INSERT INTO %(table)s_fts (rowid, description) VALUES (new.issue_id, new.description); END' % names
+    ))
+    # Index the rows that already exist
+    connection.execute(text("INSERT INTO %(table)s_fts (%(table)s_fts) VALUES ('rebuild')" % names))
+
+
+# Add the full-text search index over issue descriptions
+@migration(4, 'Full-text search index over issue descriptions')
+def index_issue_descriptions(connection, metadata):
+    create_search_index(connection, 'issues')
+
+
+# Add the issue counters behind the home page dashboard, filled from the existing issues
+@migration(5, 'Issue counters for the dashboard')
+def create_issue_counters(connection, metadata):
+    metadata.tables['issue_counters'].create(connection, checkfirst=True)
+    connection.execute(text('DELETE FROM issue_counters'))
+    connection.execute(text(
+        'INSERT INTO issue_counters (status, category, location, support_name, count) '
+        "SELECT status, category, location, COALESCE(support_name, ''), COUNT(*) FROM issues "
+        "GROUP BY status, category, location, COALESCE(support_name, '')"
+    ))
+
+
+# Track when issues change, for the ETags and Last-Modified times of the JSON API
+@migration(6, 'Issue change times and change marker')
+def track_issue_changes(connection, metadata):
+    if 'updated_at' not in [column['name'] for column in inspect(connection).get_columns('issues')]:
+        connection.execute(text('ALTER TABLE issues ADD COLUMN updated_at TIMESTAMP'))
+    connection.execute(text('UPDATE issues SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL'))
+    # The marker table holds a single row, bumped by every transaction that changes issues
+    metadata.tables['issue_change_marker'].create(connection, checkfirst=True)
+    if connection.execute(text('SELECT COUNT(*) FROM issue_change_marker')).scalar() == 0:
+        connection.execute(text('INSERT INTO issue_change_marker (marker_id, version, changed_at) VALUES (1, 1, CURRENT_TIMESTAMP)'))
+
+
+# Add the archive that issues resolved long ago are moved to, so the issues table only holds the live set
+@migration(7, 'Issue resolution times and archive')
+def create_issue_archive(connection, metadata):
+    if 'resolved_at' not in [column['name'] for column in inspect(connection).get_columns('issues')]:
+        connection.execute(text('ALTER TABLE issues ADD COLUMN resolved_at TIMESTAMP'))
+    # Issues resolved before the column existed count as resolved when they last changed
+    connection.execute(text("UPDATE issues SET resolved_at = updated_at WHERE status IN ('Resolved') AND resolved_at IS NULL"))
+    # Issues of a status in the order they were resolved, the order flask archive-issues moves them in
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_issues_resolved ON issues (status, resolved_at, issue_id)'))
+    metadata.tables['issues_archive'].create(connection, checkfirst=True)
+    # The archived issues of an employee, and the archive's own full-text search index
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_issues_archive_employee_id ON issues_archive (employee_id, issue_id)'))
+    create_search_index(connection, 'issues_archive')
+
+
+# Make room for the password hashes of every werkzeug method, which can be longer than 120 characters
+@migration(8, 'Widen users.password for longer password hashes')
+def widen_password_hashes(connection, metadata):
+    # SQLite does not enforce the length of VARCHAR columns
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('ALTER TABLE users ALTER COLUMN password TYPE VARCHAR(255)'))
+
+
+# Number the versions of issues, for the optimistic concurrency control of issue updates
+@migration(9, 'Issue versions')
+def add_issue_versions(connection, metadata):
+    for table_name in ('issues', 'issues_archive'):
+        if 'version' not in [column['name'] for column in inspect(connection).get_columns(table_name)]:
+            connection.execute(text('ALTER TABLE %s ADD COLUMN version INTEGER NOT NULL DEFAULT 1' % table_name))
+
+
+# Log the page cache tags of every issue change, so the per-process page caches only drop the entries a change affects
+@migration(10, 'Issue change log')
+def create_issue_change_log(connection, metadata):
+    metadata.tables['issue_change_log'].create(connection, checkfirst=True)
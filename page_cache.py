@@ -0,0 +1,218 @@
+# Import necessary libraries for caching the data behind the issue pages
+# json for turning cache keys into strings, pickle for storing values in a shared backend
+import json
+import pickle
+# uuid4 for the tokens that tag cache entries
+from uuid import uuid4
+# Lock makes the cache safe to share between the threads of a worker process
+from threading import Lock
+# TTLCache from ttl_cache for the in-process backend
+from ttl_cache import TTLCache
+# FILTER_FIELDS, OPEN_STATUS_FILTER from listing and is_open from assignment for working out which lists a change affects
+from listing import FILTER_FIELDS, OPEN_STATUS_FILTER
+from assignment import is_open
+
+
+# This function returns a new token for a tag, different from every token handed out before
+def new_token():
+    return uuid4().hex
+
+
+# Cache backend kept in the worker process, used unless a shared backend is configured
+# Entries and tag tokens are kept in bounded LRU caches whose entries expire after a time to live
+class LocalBackend(object):
+    def __init__(self, maxsize, ttl):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Tags outlive the entries they tag, so an entry is not dropped early because its tag expired first
+        self.tags = TTLCache(maxsize=maxsize * 4, ttl=ttl * 2)
+        self._lock = Lock()
+
+    # This method returns the entry stored for the key, or None
+    def get(self, key):
+        return self.entries.get(key)
+
+    # This method stores an entry for the key
+    def set(self, key, value):
+        self.entries.set(key, value)
+
+    # This method returns the current token of every tag, creating the tokens of tags that have none
+    def tag_tokens(self, tags):
+        with self._lock:
+            tokens = []
+            for tag in tags:
+                token = self.tags.get(tag)
+                if token is None:
+                    token = new_token()
+                    self.tags.set(tag, token)
+                tokens.append(token)
+            return tuple(tokens)
+
+    # This method drops the tokens of the tags, so the entries stored under them no longer match
+    def drop_tags(self, tags):
+        for tag in tags:
+            self.tags.delete(tag)
+
+    # This method drops every entry and tag token
+    def drop_all(self):
+        self.entries.clear()
+        self.tags.clear()
+
+    # This method returns the eviction counter and the number of entries
+    def stats(self):
+        stats = self.entries.stats()
+        return {'evictions': stats['evictions'], 'size': stats['size']}
+
+
+# Cache backend shared by every worker process through Redis, so a write in one worker invalidates the others' entries
+# The redis package is only needed when this backend is configured
+class RedisBackend(object):
+    def __init__(self, url, ttl, prefix='ticketing:cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    # This method returns the entry stored for the key, or None
+    def get(self, key):
+        data = self.client.get(self.prefix + key)
+        return pickle.loads(data) if data is not None else None
+
+    # This method stores an entry for the key
+    def set(self, key, value):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+
+    # This method returns the current token of every tag, creating the tokens of tags that have none, in one round trip
+    def tag_tokens(self, tags):
+        keys = [self.prefix + 'tag:' + tag for tag in tags]
+        pipeline = self.client.pipeline()
+        for key in keys:
+            pipeline.set(key, new_token(), nx=True, ex=self.ttl * 2)
+        for key in keys:
+            pipeline.get(key)
+        return tuple(token.decode() for token in pipeline.execute()[len(keys):])
+
+    # This method drops the tokens of the tags, so the entries stored under them no longer match
+    def drop_tags(self, tags):
+        if tags:
+            self.client.delete(*[self.prefix + 'tag:' + tag for tag in tags])
+
+    # Redis keeps its own eviction statistics
+    def stats(self):
+        return {}
+
+
+# This function returns the backend for the cache: Redis when a URL is given, otherwise the in-process backend
+def make_backend(url, maxsize, ttl):
+    if url:
+        return RedisBackend(url, ttl)
+    return LocalBackend(maxsize, ttl)
+
+
+# Cache of query results, where every entry is tagged and dropping a tag invalidates every entry tagged with it
+# Each entry is stored together with the tokens its tags had before the value was loaded, and only used while
+# all of them are still current, so a change committed while the value was being loaded is never served
+# Tags dropped in one process do not reach the entries of a LocalBackend in another process, so with a local backend
+# changes(version) should return (current version, tags changed since version) from a log of every process's changes,
+# or (current version, None) when the log cannot tell; before every lookup the tags changed since the last call are
+# dropped, or the whole backend when the log cannot tell, so only the entries a change affects are reloaded
+class QueryCache(object):
+    def __init__(self, backend, enabled=True, changes=None):
+        self.backend = backend
+        self.enabled = enabled
+        self.changes = changes
+        # Version of the change log up to which the changes have been applied to the backend, None before the first lookup
+        self.synced_version = None
+        # Counters reported by stats()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = Lock()
+
+    # This method returns the value cached for the key parts, or loads it with loader and caches it under the tags
+    # loader returning None means there is nothing to cache, e.g. the issue does not exist
+    def get_or_load(self, key_parts, tags, loader):
+        if not self.enabled:
+            return loader()
+        key = json.dumps(key_parts, sort_keys=True, separators=(',', ':'))
+        self.sync()
+        tokens = self.backend.tag_tokens(tags)
+        entry = self.backend.get(key)
+        if entry is not None and entry[0] == tokens:
+            self._count('hits')
+            return entry[1]
+        self._count('misses')
+        value = loader()
+        if value is not None:
+            self.backend.set(key, (tokens, value))
+        return value
+
+    # This method drops the tags changed by other processes since the last call, see changes
+    # Threads syncing at the same time may drop the same tags twice, which only costs a reload
+    def sync(self):
+        if self.changes is None:
+            return
+        synced_version = self.synced_version
+        version, tags = self.changes(synced_version)
+        if version == synced_version:
+            return
+        if tags is None:
+            self.backend.drop_all()
+        elif tags:
+            self.backend.drop_tags(tags)
+            self._count('invalidations', len(tags))
+        self.synced_version = version
+
+    # This method invalidates every entry tagged with one of the tags
+    def invalidate(self, tags):
+        tags = sorted(set(tags))
+        if self.enabled and tags:
+            self.backend.drop_tags(tags)
+            self._count('invalidations', len(tags))
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    # This method returns the hit, miss and invalidation counters together with the backend's statistics
+    def stats(self):
+        with self._lock:
+            stats = {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations}
+        stats.update(self.backend.stats())
+        return stats
+
+
+# This function returns the tag of an issue's detail page
+def issue_tag(issue_id):
+    return 'issue:%d' % issue_id
+
+
+# This function returns the tag of the lists of issues reported by an employee
+def employee_issues_tag(employee_id):
+    return 'employee:%d' % employee_id
+
+
+# This function returns the tag of the lists of all issues with the given filters
+# A change can only affect such a list if the issue matches every filter, so it is enough to tag the list with
+# its first filter; unfiltered lists are affected by every change
+def issue_list_tags(filters):
+    for field in FILTER_FIELDS:
+        if field in filters:
+            return ['issues:%s=%s' % (field, filters[field])]
+    return ['issues:*']
+
+
+# This function returns the tags of every cache entry that an issue going from the before state to the after state affects
+def issue_change_tags(before, after):
+    tags = {'issues:*'}
+    for state in (before, after):
+        if state is None:
+            continue
+        if state.issue_id is not None:
+            tags.add(issue_tag(state.issue_id))
+        if state.employee_id is not None:
+            tags.add(employee_issues_tag(state.employee_id))
+        for field in FILTER_FIELDS:
+            tags.add('issues:%s=%s' % (field, getattr(state, field)))
+        if is_open(state.status):
+            tags.add('issues:status=%s' % OPEN_STATUS_FILTER)
+    return tags
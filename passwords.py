@@ -0,0 +1,103 @@
+# Import necessary libraries for hashing and checking passwords off the request threads
+# ThreadPoolExecutor and TimeoutError for the bounded pool the hashing runs in
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+# BoundedSemaphore limits the hashing work waiting for the pool, Lock guards the counters
+from threading import BoundedSemaphore, Lock
+# generate_password_hash, check_password_hash from werkzeug for the hashes themselves
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Hash method of new passwords: PBKDF2-HMAC-SHA256 with 260000 iterations, werkzeug's default
+DEFAULT_HASH_METHOD = 'pbkdf2:sha256:260000'
+
+
+# Raised when the pool already has as much hashing work waiting as it may hold, or the work took too long
+class PasswordServiceBusy(Exception):
+    pass
+
+
+# This function returns the method a password hash was made with, e.g. 'pbkdf2:sha256:260000' or 'sha256'
+def hash_method(password_hash):
+    return password_hash.split('$', 1)[0] if password_hash and '$' in password_hash else None
+
+
+# Hashes and checks passwords with a configurable method in a bounded pool of threads
+# Hashing is slow on purpose, so at most `workers` passwords are hashed at once and at most `max_pending` wait
+# for a thread; any more are rejected with PasswordServiceBusy instead of tying up the request threads
+class PasswordService(object):
+    def __init__(self, method=DEFAULT_HASH_METHOD, salt_length=16, workers=2, max_pending=32, timeout=10.0):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self.timeout = timeout
+        self.max_slots = workers + max_pending
+        self._slots = BoundedSemaphore(self.max_slots)
+        self._executor = None
+        self._dummy_hash = None
+        self._lock = Lock()
+        # Counters reported by stats()
+        self.hashed = 0
+        self.verified = 0
+        self.rejected = 0
+
+    # This method returns the pool, creating it on first use, so a process forked before any hashing gets its own threads
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            return self._executor
+
+    # This method drops the pool inherited from a parent process, whose threads do not exist after a fork
+    def reset(self):
+        with self._lock:
+            self._executor = None
+            self._slots = BoundedSemaphore(self.max_slots)
+
+    # This method runs function in the pool and waits for its result, or raises PasswordServiceBusy
+    def _run(self, function, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            self._count('rejected')
+            raise PasswordServiceBusy()
+        try:
+            future = self._pool().submit(function, *args)
+        except Exception:
+            slots.release()
+            raise
+        # The slot is only given back once the work is done, even if we stop waiting for it
+        future.add_done_callback(lambda done: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            self._count('rejected')
+            raise PasswordServiceBusy()
+
+    # This method returns the hash of a password, made with the configured method
+    def hash(self, password):
+        password_hash = self._run(generate_password_hash, password, self.method, self.salt_length)
+        self._count('hashed')
+        return password_hash
+
+    # This method tells whether the password matches the hash
+    # Without a hash, e.g. for an unknown email, a dummy hash is checked so the answer takes as long as for a real account
+    def verify(self, password_hash, password):
+        if password_hash is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash('dummy password')
+            self._run(check_password_hash, self._dummy_hash, password)
+            return False
+        matches = self._run(check_password_hash, password_hash, password)
+        self._count('verified')
+        return matches
+
+    # This method tells whether a hash was made with another method than the configured one and should be replaced
+    def needs_rehash(self, password_hash):
+        return hash_method(password_hash) != self.method
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    # This method returns the hashed, verified and rejected counters
+    def stats(self):
+        with self._lock:
+            return {'hashed': self.hashed, 'verified': self.verified, 'rejected': self.rejected}
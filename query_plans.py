@@ -0,0 +1,37 @@
+# Import necessary libraries for checking the query plans of the routes' queries
+# re for spotting sort steps in the plans
+import re
+# text from sqlalchemy for running EXPLAIN statements
+from sqlalchemy import text
+
+# Plan lines of a sort step: a Sort or Incremental Sort node on Postgres, a temporary B-tree for ORDER BY on SQLite
+SORT_STEP = re.compile(r'\bSort\b|USE TEMP B-TREE FOR (RIGHT PART OF |LAST TERM OF )?ORDER BY')
+
+
+# This function returns the query plan of a query as a list of lines, using EXPLAIN on Postgres and EXPLAIN QUERY PLAN on SQLite
+def explain(connection, query):
+    # Bound values are rendered inline so the plan is the one the database picks for real values,
+    # which is what lets it match the partial indexes on open issues
+    statement = getattr(query, 'statement', query)
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+    if connection.dialect.name == 'postgresql':
+        # On a small table Postgres prefers a sequential scan, so disable it to see whether an index can be used at all
+        connection.execute(text('SET LOCAL enable_seqscan = off'))
+        return [row[0] for row in connection.execute(text('EXPLAIN ' + sql))]
+    return [row[-1] for row in connection.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+
+
+# This function runs every (name, query, index names) check and reports whether the plan uses one of the indexes
+# A check with a fourth element set, (name, query, index names, True), also fails if the plan sorts the rows rather
+# than reading them in the order of the index, as the keyset paginated lists must
+# It returns a list of (name, passed, plan lines) tuples
+def check_plans(engine, checks):
+    results = []
+    for name, query, indexes, *ordered_by_index in checks:
+        with engine.begin() as connection:
+            plan = explain(connection, query)
+        passed = any(index in line for line in plan for index in indexes)
+        if ordered_by_index and ordered_by_index[0]:
+            passed = passed and not any(SORT_STEP.search(line) for line in plan)
+        results.append((name, passed, plan))
+    return results
@@ -0,0 +1,54 @@
+# Import necessary libraries for limiting how often a client may attempt something
+# ceil for rounding the seconds until the next attempt up
+from math import ceil
+# Lock makes the limiter safe to share between the threads of a worker process
+from threading import Lock
+# time.monotonic is used for the windows, unaffected by changes of the wall clock
+import time
+# TTLCache from ttl_cache bounds the number of keys tracked, and forgets keys whose window has passed
+from ttl_cache import TTLCache
+
+
+# Allows at most `limit` attempts per key in a fixed window of `window` seconds, starting with the key's first attempt
+# The limits are kept per worker process, like the role and page caches
+class RateLimiter(object):
+    def __init__(self, limit, window, maxsize=10000, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self._clock = clock
+        # Maps each key to the (start of the window, number of attempts) pair of its current window
+        self._windows = TTLCache(maxsize=maxsize, ttl=window, clock=clock)
+        self._lock = Lock()
+        # Counter reported by stats()
+        self.limited = 0
+
+    # This method returns the number of seconds until the key may attempt again, 0 if it may attempt now
+    def retry_after(self, key):
+        entry = self._windows.get(key)
+        if entry is None or entry[1] < self.limit:
+            return 0
+        remaining = entry[0] + self.window - self._clock()
+        if remaining <= 0:
+            return 0
+        with self._lock:
+            self.limited += 1
+        return max(1, ceil(remaining))
+
+    # This method records an attempt of the key
+    def hit(self, key):
+        with self._lock:
+            now = self._clock()
+            entry = self._windows.get(key)
+            if entry is None or entry[0] + self.window <= now:
+                entry = (now, 0)
+            self._windows.set(key, (entry[0], entry[1] + 1))
+
+    # This method forgets the attempts of the key, e.g. after a successful login
+    def reset(self, key):
+        self._windows.delete(key)
+
+    # This method returns the number of limited attempts and of keys tracked
+    def stats(self):
+        with self._lock:
+            limited = self.limited
+        return {'limited': limited, 'keys': self._windows.stats()['size']}
@@ -0,0 +1,43 @@
+# Import necessary libraries for sending reads to read replicas of the database
+# random for spreading the requests over the replicas
+import random
+# SQLAlchemy, SignallingSession from flask_sqlalchemy for a session that picks its engine per statement
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+# orm from sqlalchemy for the session factory
+from sqlalchemy import orm
+
+
+# Session that sends its reads to the replica engine in info['read_replica'], when there is one
+# Flushes and INSERT, UPDATE and DELETE statements always go to the primary, and set info['wrote'] so the caller
+# can keep the user on the primary until the replicas have caught up
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or (clause is not None and getattr(clause, 'is_dml', False)):
+            self.info['wrote'] = True
+            return SignallingSession.get_bind(self, mapper, clause)
+        replica = self.info.get('read_replica')
+        if replica is not None:
+            return replica
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+# Flask-SQLAlchemy extension whose sessions are RoutingSessions
+# Without a read replica set on the session, it behaves exactly like SQLAlchemy
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+# This function sends the reads of the session to one of the replica engines, picked at random
+def use_replica(session, engines):
+    session.info['read_replica'] = random.choice(engines)
+
+
+# This function runs loader with the reads of the session sent to the primary, and returns its result
+def read_from_primary(session, loader):
+    replica = session.info.pop('read_replica', None)
+    try:
+        return loader()
+    finally:
+        if replica is not None:
+            session.info['read_replica'] = replica
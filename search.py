@@ -0,0 +1,50 @@
+# Import necessary libraries for full-text search over issue descriptions
+# re for splitting the search text into words
+import re
+# func, literal_column, table, column from sqlalchemy for the dialect specific search expressions
+from sqlalchemy import func, literal_column, table, column
+
+# Highest page of search results a client can ask for
+MAX_SEARCH_PAGE = 100
+
+
+# Full-text search on Postgres, backed by a generated tsvector column with a GIN index
+class PostgresSearch(object):
+    def __init__(self, table_name):
+        # The tsvector column of the searched table, maintained by Postgres on every insert and update
+        self.vector = literal_column('%s.search_vector' % table_name)
+
+    # This method restricts the query to rows matching the search text and orders them by relevance
+    def apply(self, query, id_column, text):
+        # websearch_to_tsquery accepts free text, quoted phrases and -exclusions without raising syntax errors
+        ts_query = func.websearch_to_tsquery('english', text)
+        rank = func.ts_rank(self.vector, ts_query)
+        return query.filter(self.vector.op('@@')(ts_query)).order_by(rank.desc(), id_column.desc())
+
+
+# Full-text search on SQLite, backed by an external content FTS5 table kept in step by triggers
+class SqliteSearch(object):
+    def __init__(self, fts_table_name):
+        self.fts = table(fts_table_name, column('rowid'), column('rank'))
+        self.fts_name = literal_column(fts_table_name)
+
+    # This method restricts the query to rows matching the search text and orders them by relevance
+    def apply(self, query, id_column, text):
+        # Quote every word so characters from the FTS5 query syntax in the search text are matched literally
+        words = re.findall(r'\w+', text)
+        match = ' '.join('"%s"' % word for word in words)
+        query = query.join(self.fts, self.fts.c.rowid == id_column).filter(self.fts_name.op('MATCH')(match))
+        # FTS5's rank column is the bm25 score, where lower is more relevant
+        return query.order_by(self.fts.c.rank, id_column.desc())
+
+
+# This function returns the search backend for the table on the given database dialect
+def search_backend(dialect_name, table_name):
+    if dialect_name == 'postgresql':
+        return PostgresSearch(table_name)
+    return SqliteSearch('%s_fts' % table_name)
+
+
+# This function tells whether a search text contains anything to search for
+def has_search_terms(text):
+    return bool(re.search(r'\w', text or ''))
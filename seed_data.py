@@ -0,0 +1,104 @@
+# Import necessary libraries for generating synthetic ticketing data
+# random for drawing the data, seeded so that every run with the same seed generates the same data
+import random
+# accumulate for the cumulative weights of the skewed distributions
+from itertools import accumulate
+# datetime, timedelta for the times generated issues were resolved
+from datetime import datetime, timedelta
+# ISSUE_CATEGORIES, ISSUE_STATUSES from forms so that generated issues use the application's values
+from forms import ISSUE_CATEGORIES, ISSUE_STATUSES
+
+# Password of every generated account, so the benchmark can log in as any of them
+SEED_PASSWORD = 'benchmark'
+# Locations the generated employees work at
+LOCATIONS = ['Building A', 'Building B', 'Building C', 'Building D', 'Remote']
+# Share of the issues in each category, in ISSUE_CATEGORIES order: network and software problems dominate
+CATEGORY_WEIGHTS = [15, 30, 30, 15, 10]
+# Share of the issues in each status, in ISSUE_STATUSES order: most tickets are resolved
+STATUS_WEIGHTS = [15, 10, 75]
+# Resolved issues were resolved up to this many days ago, so some of them are old enough to be archived
+RESOLVED_MAX_AGE_DAYS = 365
+# Words the generated issue descriptions are made of
+DESCRIPTION_WORDS = ['printer', 'laptop', 'monitor', 'keyboard', 'vpn', 'wifi', 'email', 'password', 'login', 'slow',
+                     'broken', 'crash', 'error', 'license', 'update', 'install', 'network', 'drive', 'screen', 'battery',
+                     'outlook', 'teams', 'badge', 'scanner', 'phone', 'headset', 'access', 'folder', 'server', 'backup']
+
+
+# This function returns the email of the generated employee with the given number
+def employee_email(number):
+    return 'employee%d@example.com' % number
+
+
+# This function returns the email of the generated support staff member with the given number
+def support_email(number):
+    return 'support%d@example.com' % number
+
+
+# This function returns cumulative Zipf weights for n items, so a few items get most of the draws
+# skew 0 is uniform, 1 is a classic Zipf distribution
+def zipf_weights(n, skew):
+    return list(accumulate(1.0 / (rank ** skew) for rank in range(1, n + 1)))
+
+
+# Generator of synthetic employees, support staff and issues with realistic skew
+# A few employees report most of the issues, a few support staff members handle most of them,
+# and the categories and statuses follow CATEGORY_WEIGHTS and STATUS_WEIGHTS
+class SyntheticData(object):
+    def __init__(self, employees, support_staff, issues, seed=0, skew=1.1, first_employee_id=1):
+        self.employees = employees
+        self.support_staff = support_staff
+        self.issues = issues
+        self.skew = skew
+        self.first_employee_id = first_employee_id
+        self.random = random.Random(seed)
+
+    # This method yields one dict per employee, with the columns of the employees table
+    def employee_rows(self):
+        for number in range(self.employees):
+            yield {
+                'employee_id': self.first_employee_id + number,
+                'name': 'Employee %d' % number,
+                'email': employee_email(number),
+                'phone': '555-%04d' % (number % 10000),
+                # Locations are skewed too: the first buildings have the most staff
+                'location': self.random.choices(LOCATIONS, cum_weights=zipf_weights(len(LOCATIONS), 0.8))[0],
+            }
+
+    # This method yields one dict per support staff member, with the columns of the support_staff table
+    def support_rows(self):
+        for number in range(self.support_staff):
+            yield {'name': 'Support %d' % number, 'email': support_email(number)}
+
+    # This method yields one dict per user account, with the columns of the users table
+    # password_hash is the hash of SEED_PASSWORD, computed once by the caller since hashing is slow on purpose
+    def user_rows(self, password_hash):
+        for number in range(self.employees):
+            yield {'email': employee_email(number), 'password': password_hash}
+        for number in range(self.support_staff):
+            yield {'email': support_email(number), 'password': password_hash}
+
+    # This method yields one dict per issue, with the columns of the issues table
+    # employees maps each employee id to its row, as generated by employee_rows
+    def issue_rows(self, employees):
+        reporter_ids = sorted(employees)
+        reporter_weights = zipf_weights(len(reporter_ids), self.skew)
+        support_names = ['Support %d' % number for number in range(self.support_staff)]
+        support_weights = zipf_weights(len(support_names), self.skew / 2) if support_names else None
+        now = datetime.utcnow()
+        for number in range(self.issues):
+            employee = employees[self.random.choices(reporter_ids, cum_weights=reporter_weights)[0]]
+            status = self.random.choices(ISSUE_STATUSES, weights=STATUS_WEIGHTS)[0]
+            resolved_at = None
+            if status == ISSUE_STATUSES[-1]:
+                resolved_at = now - timedelta(seconds=self.random.randint(0, RESOLVED_MAX_AGE_DAYS * 86400))
+            yield {
+                'employee_id': employee['employee_id'],
+                'employee_name': employee['name'],
+                'employee_email': employee['email'],
+                'location': employee['location'],
+                'category': self.random.choices(ISSUE_CATEGORIES, weights=CATEGORY_WEIGHTS)[0],
+                'description': ' '.join(self.random.choices(DESCRIPTION_WORDS, k=self.random.randint(4, 30))),
+                'status': status,
+                'support_name': self.random.choices(support_names, cum_weights=support_weights)[0] if support_names else None,
+                'resolved_at': resolved_at,
+            }
@@ -0,0 +1,78 @@
+# Shared fixtures of the tests: the application on a temporary SQLite database, with an employee and a support user
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+# Point the application at a temporary SQLite database before it is imported
+DATABASE_DIR = tempfile.mkdtemp(prefix='ticketing-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DATABASE_DIR, 'app.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as ticketing
+
+
+# The application module, with its schema and users created once for every test
+@pytest.fixture(scope='session')
+def app_module():
+    ticketing.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with ticketing.app.app_context():
+        ticketing.upgrade(ticketing.db.engine, ticketing.db.metadata)
+        ticketing.db.session.add(ticketing.Users(email='support@email.com', password=generate_password_hash('support')))
+        ticketing.db.session.add(ticketing.SupportStaff(name='Support', email='support@email.com'))
+        ticketing.db.session.commit()
+    client = ticketing.app.test_client()
+    client.post('/register', data=dict(employee_id=1, name='Employee', email='employee@email.com', phone='1',
+                                       location='A', password='employee', confirm_password='employee'))
+    return ticketing
+
+
+# This function returns a test client logged in with the email and password
+def login(app_module, email, password):
+    client = app_module.app.test_client()
+    response = client.post('/login', data=dict(email=email, password=password))
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def employee(app_module):
+    return login(app_module, 'employee@email.com', 'employee')
+
+
+@pytest.fixture
+def support(app_module):
+    return login(app_module, 'support@email.com', 'support')
+
+
+# Reports a new issue as the employee and returns its id
+@pytest.fixture
+def new_issue(app_module, employee):
+    def report(description='printer is broken'):
+        response = employee.post('/issue/new', data=dict(category='Printing', description=description))
+        assert response.status_code == 302
+        with app_module.app.app_context():
+            return app_module.db.session.query(app_module.func.max(app_module.Issue.issue_id)).scalar()
+    return report
+
+
+# Records the SQL statements the application runs while the with block runs
+@pytest.fixture
+def statements(app_module):
+    @contextmanager
+    def record():
+        executed = []
+        def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            executed.append(' '.join(statement.split()))
+        with app_module.app.app_context():
+            engine = app_module.db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield executed
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return record
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+
+# This function registers an employee of their own for a test, and returns a test client logged in as them
+def employee_client(app_module, employee_id, email):
+    client = app_module.app.test_client()
+    client.post('/register', data=dict(employee_id=employee_id, name='Employee %d' % employee_id, email=email, phone='1',
+                                       location='B', password='secret', confirm_password='secret'))
+    assert client.post('/login', data=dict(email=email, password='secret')).status_code == 302
+    return client
+
+
+# This function reports an issue as the client, and returns its id
+def report(app_module, client):
+    assert client.post('/issue/new', data=dict(category='Other', description='monitor flickers')).status_code == 302
+    with app_module.app.app_context():
+        return app_module.db.session.query(app_module.func.max(app_module.Issue.issue_id)).scalar()
+
+
+# This function changes the email of the client's account
+def change_email(client, email):
+    response = client.post('/account', data=dict(email=email, password='', confirm_password='', action='update'))
+    assert response.status_code == 302
+
+
+# This function asserts that a conditional GET of the issue with the earlier ETag returns the issue with the email
+def assert_refetched(client, issue_id, etag, email):
+    response = client.get('/api/v1/issues/%d' % issue_id, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['issue']['employee_email'] == email
+    assert response.headers['ETag'] != etag
+
+
+def test_unchanged_issue_is_not_modified(app_module, employee, new_issue):
+    issue_id = new_issue()
+    etag = employee.get('/api/v1/issues/%d' % issue_id).headers['ETag']
+    assert employee.get('/api/v1/issues/%d' % issue_id, headers={'If-None-Match': etag}).status_code == 304
+
+
+# A changed email is written to the issues with a bulk UPDATE, which must still change their ETag
+def test_changed_email_invalidates_issue_etag(app_module):
+    client = employee_client(app_module, 101, 'live@email.com')
+    issue_id = report(app_module, client)
+    etag = client.get('/api/v1/issues/%d' % issue_id).headers['ETag']
+    change_email(client, 'live-changed@email.com')
+    assert_refetched(client, issue_id, etag, 'live-changed@email.com')
+
+
+def test_changed_email_invalidates_archived_issue_etag(app_module, support):
+    client = employee_client(app_module, 102, 'archived@email.com')
+    issue_id = report(app_module, client)
+    version = support.get('/api/v1/issues/%d' % issue_id).get_json()['issue']['version']
+    assert support.patch('/api/v1/issues/%d' % issue_id, json=dict(status='Resolved', version=version)).status_code == 200
+    with app_module.app.app_context():
+        assert app_module.archive_issue_batch(datetime.utcnow() + timedelta(days=1), 1000) >= 1
+    etag = client.get('/api/v1/issues/%d' % issue_id).headers['ETag']
+    change_email(client, 'archived-changed@email.com')
+    assert_refetched(client, issue_id, etag, 'archived-changed@email.com')
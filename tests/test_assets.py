@@ -0,0 +1,22 @@
+import os
+import re
+
+from assets import VENDOR_ASSETS, integrity_hash
+
+
+# The vendored files are committed, and match the integrity hashes they were downloaded with
+def test_vendored_files_match_their_integrity(app_module):
+    for filename, (url, integrity) in VENDOR_ASSETS.items():
+        with open(os.path.join(app_module.app.static_folder, filename), 'rb') as source:
+            assert integrity_hash(source.read(), integrity.split('-', 1)[0]) == integrity
+
+
+# Pages link Bootstrap from the application itself, under a fingerprinted URL, never from its CDN
+def test_pages_link_vendored_bootstrap(app_module):
+    client = app_module.app.test_client()
+    body = client.get('/login').data.decode()
+    assert 'bootstrapcdn' not in body
+    url = re.search(r'href="(/assets/[0-9a-f]+/vendor/bootstrap-4.0.0.min.css)"', body).group(1)
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
@@ -0,0 +1,10 @@
+# Running create-support-from-file again reports the accounts that exist already, instead of skipping them silently
+def test_create_support_from_file_reports_existing_accounts(app_module, tmp_path):
+    path = tmp_path / 'support.csv'
+    path.write_text('name,email,password\nHelper,helper@email.com,secret\n')
+    runner = app_module.app.test_cli_runner()
+    first = runner.invoke(args=['create-support-from-file', str(path)])
+    assert '1 support staff members created, 0 existed already' in first.output
+    second = runner.invoke(args=['create-support-from-file', str(path)])
+    assert 'Line 2 was skipped: an account for helper@email.com exists already and was not updated' in second.output
+    assert '0 support staff members created, 1 existed already and were not updated, 0 skipped.' in second.output
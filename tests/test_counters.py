@@ -0,0 +1,30 @@
+import re
+
+
+# This function returns the index of the first statement that matches the pattern
+def first_index(statements, pattern):
+    return next(index for index, statement in enumerate(statements) if re.search(pattern, statement, re.I))
+
+
+# An update locks the issue row before the counter rows, in the order the bulk updates and the archiving lock them,
+# so it cannot deadlock with them
+def test_update_writes_issue_before_counters(support, new_issue, statements):
+    issue_id = new_issue()
+    version = re.search(rb'name="version"[^>]*value="(\d+)"', support.get('/issue/%d/update' % issue_id).data).group(1)
+    with statements() as executed:
+        response = support.post('/issue/%d/update' % issue_id, data=dict(status='In Progress', version=version.decode()))
+    assert response.status_code == 302
+    assert first_index(executed, r'^UPDATE issues ') < first_index(executed, r'issue_counters')
+
+
+def test_new_issue_writes_issue_before_counters(new_issue, statements):
+    with statements() as executed:
+        new_issue()
+    assert first_index(executed, r'^INSERT INTO issues ') < first_index(executed, r'issue_counters')
+
+
+def test_delete_writes_issue_before_counters(employee, new_issue, statements):
+    issue_id = new_issue()
+    with statements() as executed:
+        assert employee.post('/issue/%d/delete' % issue_id).status_code == 302
+    assert first_index(executed, r'^DELETE FROM issues ') < first_index(executed, r'issue_counters')
@@ -0,0 +1,30 @@
+import re
+
+
+# This function returns the version carried by the update form of the issue
+def form_version(client, issue_id):
+    body = client.get('/issue/%d/update' % issue_id).data
+    return re.search(rb'name="version" type="hidden" value="(\d+)"', body).group(1).decode()
+
+
+def test_update_with_current_version(support, new_issue):
+    issue_id = new_issue()
+    response = support.post('/issue/%d/update' % issue_id, data=dict(status='Resolved', version=form_version(support, issue_id)))
+    assert response.status_code == 302
+
+
+def test_update_with_stale_version_conflicts(support, new_issue):
+    issue_id = new_issue()
+    version = form_version(support, issue_id)
+    assert support.post('/issue/%d/update' % issue_id, data=dict(status='In Progress', version=version)).status_code == 302
+    response = support.post('/issue/%d/update' % issue_id, data=dict(status='Resolved', version=version))
+    assert response.status_code == 409
+
+
+# An update form without a version would overwrite changes its user never saw, so it is refused like a stale one
+def test_update_without_version_conflicts(support, employee, new_issue):
+    issue_id = new_issue()
+    assert support.post('/issue/%d/update' % issue_id, data=dict(status='Resolved')).status_code == 409
+    response = employee.post('/issue/%d/update' % issue_id, data=dict(category='Other', description='changed'))
+    assert response.status_code == 409
+    assert b'missing the version' in response.data
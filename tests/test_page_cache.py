@@ -0,0 +1,62 @@
+from page_cache import QueryCache, LocalBackend
+
+
+# Change log standing in for the issue change log of the database: a list of the tags changed by each version
+class ChangeLog(object):
+    def __init__(self):
+        self.versions = []
+        # Set when the log no longer holds the changes since a version, e.g. when it has been trimmed
+        self.trimmed = False
+
+    def changes(self, version):
+        current = len(self.versions)
+        if version is None or self.trimmed:
+            return current, None
+        if current == version:
+            return current, []
+        return current, {tag for tags in self.versions[version:] for tag in tags}
+
+
+# This function returns a loader that counts how often it was called, and the list it counts in
+def counting_loader(value):
+    calls = []
+    def load():
+        calls.append(value)
+        return value
+    return load, calls
+
+
+# A change made by another process only drops the entries tagged with the tags it changed
+def test_logged_changes_drop_only_their_tags():
+    log = ChangeLog()
+    cache = QueryCache(LocalBackend(100, 60), changes=log.changes)
+    load_one, one_calls = counting_loader('one')
+    load_two, two_calls = counting_loader('two')
+    cache.get_or_load(['issue', 1], ['issue:1'], load_one)
+    cache.get_or_load(['issue', 2], ['issue:2'], load_two)
+    log.versions.append(['issue:1'])
+    cache.get_or_load(['issue', 1], ['issue:1'], load_one)
+    cache.get_or_load(['issue', 2], ['issue:2'], load_two)
+    assert len(one_calls) == 2
+    assert len(two_calls) == 1
+
+
+# When the log cannot tell which tags changed, every entry is dropped
+def test_unknown_changes_drop_every_entry():
+    log = ChangeLog()
+    cache = QueryCache(LocalBackend(100, 60), changes=log.changes)
+    load, calls = counting_loader('value')
+    cache.get_or_load(['issue', 1], ['issue:1'], load)
+    log.versions.append(['issue:2'])
+    log.trimmed = True
+    cache.get_or_load(['issue', 1], ['issue:1'], load)
+    assert len(calls) == 2
+
+
+# A transaction changing an issue logs the page cache tags of the change under the new marker version
+def test_issue_change_is_logged_with_its_tags(app_module, new_issue):
+    issue_id = new_issue()
+    with app_module.app.app_context():
+        version = app_module.read_issue_change_marker()[0]
+        assert 'issue:%d' % issue_id in app_module.issue_changes_since(version - 1)[1]
+        assert app_module.issue_changes_since(version) == (version, [])
@@ -0,0 +1,66 @@
+# Import necessary libraries for a small in-process cache
+# OrderedDict keeps the entries in least recently used order
+from collections import OrderedDict
+# Lock makes the cache safe to share between the threads of a worker process
+from threading import Lock
+# time.monotonic is used to expire entries, unaffected by changes of the wall clock
+import time
+
+
+# Bounded least-recently-used cache whose entries also expire after a fixed time to live
+class TTLCache(object):
+    def __init__(self, maxsize=1024, ttl=300, clock=time.monotonic):
+        # Maximum number of entries kept before the least recently used one is evicted
+        self.maxsize = maxsize
+        # Number of seconds an entry stays valid after it was stored
+        self.ttl = ttl
+        self._clock = clock
+        # Maps each key to an (expiry time, value) pair
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        # Counters reported by stats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # This method returns the cached value for the key, or the default when it is missing or expired
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                # Drop the expired entry so it does not take up space until it is evicted
+                del self._entries[key]
+                self.misses += 1
+                return default
+            # Mark the entry as the most recently used one
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    # This method stores a value for the key, evicting the least recently used entries when the cache is full
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # This method removes the entry for the key, if there is one
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    # This method removes every entry
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # This method returns the hit, miss and eviction counters together with the current size
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self._entries)}
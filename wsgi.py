@@ -0,0 +1,30 @@
+# Production entry point for the application, served by gunicorn (see gunicorn.conf.py)
+# app, db, replica_engines, password_service and request_metrics from app are the Flask application, its database
+# handle, the engines of its read replicas, its password hashing pool and its metrics
+from app import app, db, replica_engines, password_service, request_metrics
+
+# Compile every template up front, so that with preload_app the worker processes inherit them ready to render
+for template_name in app.jinja_env.list_templates():
+    app.jinja_env.get_template(template_name)
+
+
+# This function is called by gunicorn in each worker process right after it is forked from the master
+def init_worker():
+    # Never reuse connections opened by the master process, each worker opens its own pool
+    db.engine.dispose(close=False)
+    for engine in replica_engines:
+        engine.dispose(close=False)
+    # Start a fresh password hashing pool, the threads of the master's pool do not exist in the worker
+    password_service.reset()
+    # Count the worker's requests from zero, the master's counts are its own
+    request_metrics.reset()
+
+
+# This function is called by gunicorn when a worker process exits, after its in-flight requests have drained
+def close_worker():
+    # Close the worker's pooled connections instead of leaving them for the database to time out
+    db.engine.dispose()
+    for engine in replica_engines:
+        engine.dispose()
+    # Hand the worker's request counts over to the totals of the retired workers, so /metrics never goes down
+    request_metrics.retire()